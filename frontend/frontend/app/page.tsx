@@ -392,7 +392,7 @@ import { Maximize2, Minimize2, BrainCircuit, Activity, BarChart3, Send, Check }
 // Import State Management & API
 import { useDashboardStore } from '@/store/useDashboardStore';
 // ADDED getQualitativeAnalysis to imports
-import { getCharts, getRatios, getPerformance, getRiskMatrix, getQualitativeAnalysis } from '@/lib/api';
+import { getCharts, getDashboard, getRatios, getQualitativeAnalysis } from '@/lib/api';
 import QuantitativeChart from '@/components/ui/QuantitativeChart';
 
 const companies = [
@@ -468,69 +468,47 @@ export default function Home() {
     return n <= 1 ? Math.round(n * 100) : Math.round(n);
   };
 
-  // inside your component in page.tsx — replace the existing effect that fetches ratios
+  // ratios, performance and risk matrix of the analysis period in one /api/dashboard request
   useEffect(() => {
-    async function fetchCategoryRatios() {
-      try {
-        // ratioGroups[selectedCategory] should be an array of metric names.
-        // Defensively coerce to array:
-        const vars = Array.isArray(ratioGroups[selectedCategory]) ? ratioGroups[selectedCategory] : [];
-
-        // timeframe expected by backend is lowercase ('quarterly'|'yearly')
-        const timeframe = (ratioPeriod || "Quarterly").toLowerCase();
-
-        // if no variables, still call backend (it will return everything or nothing depending on backend)
-        const data = await getRatios(quantCompany, vars, timeframe);
-        setRatioData(Array.isArray(data) ? data : []);
-      } catch (err) {
-        console.error("Failed fetching category ratios:", err);
-        setRatioData([]);
-      }
-    }
+    const fetchDashboard = async () => {
+      // ratioGroups[selectedCategory] should be an array of metric names. Defensively coerce to array:
+      const vars = Array.isArray(ratioGroups[selectedCategory]) ? ratioGroups[selectedCategory] : [];
+      // timeframe expected by backend is lowercase ('quarterly'|'yearly')
+      const ratioTimeframe = (ratioPeriod || "Quarterly").toLowerCase();
 
-    if (quantCompany && selectedCategory) {
-      fetchCategoryRatios();
-    }
-  }, [quantCompany, selectedCategory, ratioPeriod, /* getRatios not in deps if defined outside */]);
-
-  // fetch performance mapping for selected analysis period (qualQuarterYear)
-  useEffect(() => {
-    async function fetchPerf() {
       try {
-        const data = await getPerformance(quantCompany, qualQuarterYear, riskPeriodType);
-        setPerfMap(data || {});
+        // no chart variables: the charts have their own request below
+        const data: any = await getDashboard(quantCompany, qualQuarterYear, riskPeriodType, [], vars, riskPeriodType);
+        // a section the backend could not build comes back empty and is listed under `errors`
+        if (data?.errors) console.error("Dashboard sections failed:", data.errors);
+        setPerfMap(data?.performance || {});
+        setRiskMatrix(data?.risk_matrix || { metrics: [], tickers: [], matrix: [] });
+
+        // the dashboard's ratios use the risk timeframe; only a different ratio table timeframe needs its own request
+        const ratios = ratioTimeframe === riskPeriodType ? data?.ratios : await getRatios(quantCompany, vars, ratioTimeframe).catch((err) => {
+          console.error("Failed fetching category ratios:", err);
+          return [];
+        });
+        setRatioData(Array.isArray(ratios) ? ratios : []);
       } catch (err) {
-        console.error("Failed to fetch performance", err);
+        console.error("Failed to load dashboard data:", err);
+        setRatioData([]);
         setPerfMap({});
-      }
-    }
-    if (quantCompany && qualQuarterYear) {
-      fetchPerf();
-    }
-  }, [quantCompany, qualQuarterYear, riskPeriodType]);
-
-  // fetch risk-matrix for selected analysis period
-  useEffect(() => {
-    async function fetchRisk() {
-      try {
-        const data = await getRiskMatrix(quantCompany, qualQuarterYear, riskPeriodType, 5);
-        setRiskMatrix(data || { metrics: [], tickers: [], matrix: [] });
-      } catch (err) {
-        console.error("Failed to fetch risk matrix", err);
         setRiskMatrix({ metrics: [], tickers: [], matrix: [] });
       }
-    }
+    };
+
     if (quantCompany && qualQuarterYear) {
-      fetchRisk();
+      fetchDashboard();
     }
-  }, [quantCompany, qualQuarterYear, riskPeriodType, 5]);
+  }, [quantCompany, selectedCategory, ratioPeriod, qualQuarterYear, riskPeriodType]);
 
   // --- THE REACTIVITY ENGINE (UPDATED FOR MULTI-SELECT) ---
   useEffect(() => {
     const fetchChartData = async () => {
       // Ensure quantVariable is treated as an array
       const variables = Array.isArray(quantVariable) ? quantVariable : [quantVariable];
-      
+
       if (variables.length === 0) return;
 
       setIsChartLoading(true);
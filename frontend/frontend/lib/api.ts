@@ -28,19 +28,58 @@ const pollTaskResult = async (taskId: string) => {
   throw new Error("Request timed out waiting for backend task.");
 };
 
+// Push-based completion: /api/task-events sends one Server-Sent Event when the task
+// finishes. Falls back to polling when EventSource is unavailable or the stream fails.
+const waitForTask = (taskId: string) => {
+  if (typeof EventSource === "undefined") {
+    return pollTaskResult(taskId);
+  }
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${apiClient.defaults.baseURL}/api/task-events/${taskId}`);
+    source.onmessage = (event) => {
+      source.close();
+      const data = JSON.parse(event.data);
+      if (data.status === "completed") {
+        resolve(data.data);
+      } else if (data.status === "failed") {
+        reject(new Error(`Task failed: ${data.error}`));
+      } else if (data.status === "timeout") {
+        reject(new Error("Request timed out waiting for backend task."));
+      } else {
+        reject(new Error(`Task ended with status ${data.status}`));
+      }
+    };
+    source.onerror = () => {
+      source.close();
+      pollTaskResult(taskId).then(resolve, reject);
+    };
+  });
+};
+
+// Quant endpoints answer inline ({status: "completed", data}) when the backend
+// cache is warm, and with a task_id to wait for otherwise
+const resolveResult = async (data: { task_id?: string; status?: string; data?: unknown }) => {
+  if (data.status === "completed") {
+    return data.data;
+  }
+  return waitForTask(data.task_id as string);
+};
+
 // ---- Charts ----
 export const getCharts = async (
   company: string,
   timeframe: string,
-  variables: string[]
+  variables: string[],
+  maxPoints?: number
 ) => {
   const params = new URLSearchParams();
   params.append("company", company);
   params.append("timeframe", timeframe);
   variables.forEach((v) => params.append("variables", v));
+  if (maxPoints) params.append("max_points", String(maxPoints));
 
   const { data } = await apiClient.get(`/api/charts?${params.toString()}`);
-  return pollTaskResult(data.task_id);
+  return resolveResult(data);
 };
 
 // ---- Ratios ----
@@ -55,24 +94,94 @@ export const getRatios = async (
   variables.forEach((v) => params.append("variables", v));
 
   const { data } = await apiClient.get(`/api/ratios?${params.toString()}`);
-  return pollTaskResult(data.task_id);
+  return resolveResult(data);
+};
+
+// ---- Ratio comparison (several companies / periods in one response) ----
+export const getRatioComparison = async (
+  companies: string[],
+  variables: string[],
+  periods: string[],
+  timeframe: string
+) => {
+  const params = new URLSearchParams();
+  companies.forEach((c) => params.append("companies", c));
+  variables.forEach((v) => params.append("variables", v));
+  periods.forEach((p) => params.append("periods", p));
+  params.append("timeframe", timeframe);
+
+  const { data } = await apiClient.get(`/api/ratios/compare?${params.toString()}`);
+  return resolveResult(data);
+};
+
+// ---- Rolling market analytics (returns, volatility, drawdown, peer beta) ----
+export const getMarketAnalytics = async (
+  companies: string[],
+  metrics: string[],
+  timeframe: string,
+  window?: number
+) => {
+  const params = new URLSearchParams();
+  companies.forEach((c) => params.append("companies", c));
+  metrics.forEach((m) => params.append("metrics", m));
+  params.append("timeframe", timeframe);
+  if (window) params.append("window", String(window));
+
+  const { data } = await apiClient.get(`/api/analytics?${params.toString()}`);
+  return resolveResult(data);
 };
 
-// ---- Risk Matrix ----
+// ---- Risk Matrix (scored against every company of the period by default) ----
 export const getRiskMatrix = async (
   company: string,
   period: string,
   timeframe: string,
-  top_n: number
+  peers?: "period" | "trailing" | "none",
+  trailing?: number
 ) => {
   const params = new URLSearchParams();
   params.append("company", company);
   params.append("period", period);
   params.append("timeframe", timeframe);
-  params.append("top_n", String(top_n));
+  if (peers) params.append("peers", peers);
+  if (trailing) params.append("trailing", String(trailing));
 
   const { data } = await apiClient.get(`/api/risk_matrix?${params.toString()}`);
-  return pollTaskResult(data.task_id);
+  return resolveResult(data);
+};
+
+// ---- Risk drivers (ratios pushing a company's risk up the most) ----
+export const getRiskDrivers = async (
+  company: string,
+  period: string,
+  timeframe: string,
+  top_n: number,
+  method?: "percentile" | "zscore" | "minmax"
+) => {
+  const params = new URLSearchParams();
+  params.append("company", company);
+  params.append("period", period);
+  params.append("timeframe", timeframe);
+  params.append("top_n", String(top_n));
+  if (method) params.append("method", method);
+
+  const { data } = await apiClient.get(`/api/risk_matrix/drivers?${params.toString()}`);
+  return resolveResult(data);
+};
+
+// ---- Risk history (category risk scores for every period, e.g. trend charts) ----
+export const getRiskHistory = async (
+  companies: string[],
+  timeframe: string,
+  peers?: "period" | "none"
+) => {
+  const params = new URLSearchParams();
+  companies.forEach((c) => params.append("companies", c));
+  params.append("timeframe", timeframe);
+  if (peers) params.append("peers", peers);
+
+  const { data } = await apiClient.get(`/api/risk_matrix/history?${params.toString()}`);
+  return resolveResult(data);
 };
 
 // ---- Performance ----
@@ -87,7 +196,30 @@ export const getPerformance = async (
   params.append("timeframe", timeframe);
 
   const { data } = await apiClient.get(`/api/performance?${params.toString()}`);
-  return pollTaskResult(data.task_id);
+  return resolveResult(data);
+};
+
+// ---- Dashboard (charts + ratios + performance + risk matrix in one task) ----
+export const getDashboard = async (
+  company: string,
+  period: string,
+  timeframe: string,
+  chartVariables: string[],
+  ratioVariables: string[],
+  chartTimeframe: string,
+  maxPoints?: number
+) => {
+  const params = new URLSearchParams();
+  params.append("company", company);
+  params.append("period", period);
+  params.append("timeframe", timeframe);
+  params.append("chart_timeframe", chartTimeframe);
+  chartVariables.forEach((v) => params.append("chart_variables", v));
+  ratioVariables.forEach((v) => params.append("ratio_variables", v));
+  if (maxPoints) params.append("max_points", String(maxPoints));
+
+  const { data } = await apiClient.get(`/api/dashboard?${params.toString()}`);
+  return resolveResult(data);
 };
 
 // ----- AI ASSISTANT -----
@@ -101,5 +233,5 @@ export const getQualitativeAnalysis = async (
     period,
     query
   });
-  return pollTaskResult(data.task_id); 
+  return waitForTask(data.task_id); 
 };
\ No newline at end of file
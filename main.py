@@ -195,25 +195,68 @@
 #     import uvicorn
 #     uvicorn.run(app, host="0.0.0.0", port=8000)
 
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+import hashlib
+import os
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import AsyncIterator, List, Literal, Optional, Sequence, Tuple
 from celery.result import AsyncResult
+import orjson
+import redis.asyncio as aioredis
 
 # Import the celery instance and tasks
 from tasks import (
-    celery_app, fetch_charts_task, fetch_ratios_task, 
-    fetch_performance_task, fetch_risk_matrix_task, fetch_qualitative_task
+    celery_app, quant_reader, enqueue_coalesced, qualitative_key, fetch_charts_task, fetch_ratios_task, fetch_ratio_comparison_task, fetch_market_analytics_task, fetch_risk_history_task, fetch_risk_drivers_task,
+    fetch_performance_task, fetch_risk_matrix_task, fetch_dashboard_task, fetch_qualitative_task
 )
-
-app = FastAPI(title="QuantiGence Backend")
+from src.services.dataset_cache import CacheMiss
+from src.services.quant_views import DEFAULT_TRAILING_PERIODS, charts_view, ratios_view, performance_view, risk_matrix_view, dashboard_view, ratio_comparison_view, market_analytics_view, risk_history_view, risk_drivers_view
+from src.services.quant_serialization import ARROW_MEDIA_TYPE, columnar_to_arrow, is_columnar
+
+# Time budget for answering a quant request inline from the warm in-process cache
+# before falling back to the Celery queue; 0 disables the fast path
+QUANT_INLINE_BUDGET_MS = float(os.getenv("QUANT_INLINE_BUDGET_MS", 50))
+# Inline views running at once. A view that overruns the budget cannot be interrupted
+# and keeps its slot until it returns; requests finding no free slot are enqueued
+QUANT_INLINE_CONCURRENCY = int(os.getenv("QUANT_INLINE_CONCURRENCY", 4))
+# Background loads into the API's own cache after an inline cache miss. The request is
+# enqueued anyway, so a warm repeats the worker's reads: 0 (default) disables them,
+# otherwise at most this many run at once, one per set of dataset slices
+QUANT_INLINE_WARM_CONCURRENCY = int(os.getenv("QUANT_INLINE_WARM_CONCURRENCY", 0))
+# dataset cache ceiling of the API process (the workers use QUANT_CACHE_MAX_MB)
+QUANT_API_CACHE_MAX_MB = int(os.getenv("QUANT_API_CACHE_MAX_MB", 128))
+quant_reader.cache.max_bytes = QUANT_API_CACHE_MAX_MB * 1024 * 1024
+
+# records: list of row dicts (default); columnar: one array per column; arrow: columnar
+# payload as an Arrow IPC stream (single-table views only, others fall back to columnar JSON)
+ResponseFormat = Literal["records", "columnar", "arrow"]
+# peer universe of the risk scores (see quant_views.RISK_PEER_UNIVERSES)
+RiskPeers = Literal["period", "trailing", "none"]
+
+# max-age for quant responses; 0 makes browsers/proxies revalidate every time, which
+# is answered with a 304 as long as the dataset versions behind the ETag are unchanged
+QUANT_HTTP_MAX_AGE = int(os.getenv("QUANT_HTTP_MAX_AGE", 0))
+
+# /api/task-events streams: how long to wait for a task, and how often to send a
+# keep-alive comment so proxies do not close an idle stream
+TASK_EVENTS_TIMEOUT_SECONDS = float(os.getenv("TASK_EVENTS_TIMEOUT_SECONDS", 180))
+TASK_EVENTS_HEARTBEAT_SECONDS = 15.0
+
+# (dataset kind, company, timeframe) slices a quant response is derived from
+DatasetSources = Sequence[Tuple[str, str, str]]
+
+app = FastAPI(title="QuantiGence Backend", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 class QualitativeRequest(BaseModel):
@@ -221,45 +264,339 @@ class QualitativeRequest(BaseModel):
     period: str
     query: str = ""
 
+def _completed(data, format: ResponseFormat = "records", headers: Optional[dict] = None):
+    """Completed-task response; columnar payloads requested as Arrow are sent as an IPC stream."""
+    if format == "arrow" and is_columnar(data):
+        return Response(content=columnar_to_arrow(data), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    return ORJSONResponse({"status": "completed", "data": data}, headers=headers)
+
+def _view_format(format: ResponseFormat) -> str:
+    """Payload shape the view builds; Arrow is encoded from the columnar payload."""
+    return "records" if format == "records" else "columnar"
+
 # --- TASK POLLING ENDPOINT ---
 @app.get("/api/task-status/{task_id}")
-async def get_task_status(task_id: str):
+async def get_task_status(task_id: str, format: ResponseFormat = "records"):
     task_result = AsyncResult(task_id, app=celery_app)
     
     if task_result.state == "PENDING" or task_result.state == "STARTED":
         return {"status": "processing"}
     elif task_result.state == "SUCCESS":
-        return {"status": "completed", "data": task_result.result}
+        return _completed(task_result.result, format)
     elif task_result.state == "FAILURE":
         return {"status": "failed", "error": str(task_result.info)}
     
     return {"status": task_result.state}
 
+# --- TASK COMPLETION EVENTS ---
+# the Celery Redis result backend publishes every stored task state on the task's
+# result key, so a stream only has to subscribe to that channel
+task_events_redis = aioredis.Redis.from_url(celery_app.conf.result_backend)
+
+def _task_event(task_id: str) -> Optional[dict]:
+    """The /api/task-status payload of a finished task, None while it is still running."""
+    task_result = AsyncResult(task_id, app=celery_app)
+    if not task_result.ready():
+        return None
+    if task_result.state == "SUCCESS":
+        return {"status": "completed", "data": task_result.result}
+    if task_result.state == "FAILURE":
+        return {"status": "failed", "error": str(task_result.info)}
+    return {"status": task_result.state}
+
+def _sse(event: dict) -> bytes:
+    return b"data: " + orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) + b"\n\n"
+
+async def _task_events(task_id: str) -> AsyncIterator[bytes]:
+    channel = celery_app.backend.get_key_for_task(task_id)
+    pubsub = task_events_redis.pubsub()
+    await pubsub.subscribe(channel)
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + TASK_EVENTS_TIMEOUT_SECONDS
+        # checked after subscribing, so a task finishing in between is not missed
+        event = await run_in_threadpool(_task_event, task_id)
+        while event is None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                event = {"status": "timeout"}
+                break
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(TASK_EVENTS_HEARTBEAT_SECONDS, remaining))
+            if message is None:
+                yield b": keep-alive\n\n"
+                continue
+            event = await run_in_threadpool(_task_event, task_id)
+        yield _sse(event)
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
+
+@app.get("/api/task-events/{task_id}")
+async def stream_task_events(task_id: str):
+    """
+    Server-Sent Events stream that pushes one event when the task finishes, with the
+    same payload /api/task-status returns ({"status": "timeout"} after
+    TASK_EVENTS_TIMEOUT_SECONDS), then closes.
+    """
+    return StreamingResponse(
+        _task_events(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- CONDITIONAL CACHING ---
+def _dataset_versions(sources: DatasetSources) -> List[str]:
+    return [
+        # "universe" stands for the whole ratios dataset (peer-relative risk scores)
+        quant_reader.universe_version(timeframe) if kind == "universe" else quant_reader.dataset_version(kind, company, timeframe)
+        for kind, company, timeframe in sources
+    ]
+
+async def _quant_versions(sources: DatasetSources) -> Optional[List[str]]:
+    """Versions of the datasets a quant response reads; None when there are no sources or a version cannot be determined."""
+    if not sources:
+        return None
+    try:
+        return await run_in_threadpool(_dataset_versions, sources)
+    except Exception as e:
+        print("DATASET VERSION ERROR:", repr(e))
+        return None
+
+def _quant_etag(request: Request, versions: Optional[List[str]]) -> Optional[str]:
+    """Strong ETag for a quant response: the endpoint, its query string and the versions of the datasets it reads."""
+    if versions is None:
+        return None
+    token = "|".join([request.url.path, request.url.query, *versions])
+    return '"' + hashlib.sha1(token.encode("utf-8")).hexdigest() + '"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={QUANT_HTTP_MAX_AGE}, must-revalidate"}
+
+# --- INLINE FAST PATH ---
+# inline views whose thread has not returned yet, and dataset slices being warmed
+_inline_running = 0
+_warming: set = set()
+
+def _inline_done(job: asyncio.Future) -> None:
+    global _inline_running
+    _inline_running -= 1
+    if not job.cancelled():
+        # mark an overrun view's error as retrieved; its request was already enqueued
+        job.exception()
+
+async def _run_inline(view, *args):
+    """
+    Run `view` on the warm-only reader within QUANT_INLINE_BUDGET_MS. The threadpool
+    call is shielded from the timeout (a thread cannot be cancelled), so an overrunning
+    view finishes in the background while holding its QUANT_INLINE_CONCURRENCY slot.
+    """
+    global _inline_running
+    _inline_running += 1
+    job = asyncio.ensure_future(run_in_threadpool(view, quant_reader.warm_only(), *args))
+    job.add_done_callback(_inline_done)
+    return await asyncio.wait_for(asyncio.shield(job), timeout=QUANT_INLINE_BUDGET_MS / 1000.0)
+
+async def _warm_cache(key, view, *args):
+    """Load the slices behind `view` into this process's cache so the next request is served inline."""
+    try:
+        await run_in_threadpool(view, quant_reader, *args)
+    except Exception as e:
+        print("CACHE WARM ERROR:", repr(e))
+    finally:
+        _warming.discard(key)
+
+def _schedule_warm(background_tasks: BackgroundTasks, sources: DatasetSources, view, *args) -> None:
+    key = tuple(sources)
+    if key in _warming or len(_warming) >= QUANT_INLINE_WARM_CONCURRENCY:
+        return
+    _warming.add(key)
+    background_tasks.add_task(_warm_cache, key, view, *args)
+
+async def _inline_or_enqueue(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    sources: DatasetSources,
+    view,
+    task,
+    *args,
+    format: ResponseFormat = "records",
+):
+    """
+    Serve a quant view straight from the warm dataset cache when it fits in the time
+    budget, answering with the same payload /api/task-status returns on completion.
+    Otherwise enqueue the Celery task as before (and, with QUANT_INLINE_WARM_CONCURRENCY
+    set, warm the cache in the background when the miss was caused by missing data).
+
+    `sources` lists the dataset slices the response reads and determines its ETag. A
+    request whose If-None-Match still matches is answered with 304 before any view or
+    task runs. Enqueued tasks are coalesced on the arguments and those dataset versions.
+    """
+    versions = await _quant_versions(sources)
+    etag = _quant_etag(request, versions)
+    if etag is not None and _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+
+    if QUANT_INLINE_BUDGET_MS > 0 and _inline_running < QUANT_INLINE_CONCURRENCY:
+        try:
+            data = await _run_inline(view, *args)
+            return _completed(data, format, _cache_headers(etag) if etag is not None else None)
+        except CacheMiss:
+            _schedule_warm(background_tasks, sources, view, *args)
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            # let the task report the error through the usual task-status path
+            print("INLINE QUANT ERROR:", repr(e))
+
+    # identical requests on the same data versions share one task (see enqueue_coalesced)
+    task_id = await run_in_threadpool(enqueue_coalesced, task, args, [*args, versions])
+    return {"task_id": task_id}
+
+@app.get("/api/dataset-versions")
+async def get_dataset_versions(company: str, timeframe: str = "quarterly"):
+    """Version tokens of the stocks, ratios and metrics data behind a company's quant views (None when missing)."""
+    def versions():
+        out = {}
+        for kind in ("stocks", "ratios", "metrics"):
+            try:
+                out[kind] = quant_reader.dataset_version(kind, company, timeframe)
+            except Exception:
+                out[kind] = None
+        return out
+
+    return await run_in_threadpool(versions)
+
 # --- ASYNC API ENDPOINTS ---
 @app.get("/api/charts")
-async def get_charts(company: str, variables: List[str] = Query(...), timeframe: str = "quarterly"):
-    task = fetch_charts_task.delay(company, variables, timeframe)
-    return {"task_id": task.id}
+async def get_charts(request: Request, background_tasks: BackgroundTasks, company: str, variables: List[str] = Query(...), timeframe: str = "quarterly", max_points: Optional[int] = Query(None, ge=3), format: ResponseFormat = "records"):
+    return await _inline_or_enqueue(request, background_tasks, [("stocks", company, timeframe)], charts_view, fetch_charts_task, company, variables, timeframe, max_points, _view_format(format), format=format)
 
 @app.get("/api/ratios")
-def get_ratios(company: str = Query(...), timeframe: str = Query("quarterly"), variables: List[str] = Query(None)):
-    task = fetch_ratios_task.delay(company, timeframe, variables or [])
-    return {"task_id": task.id}
+async def get_ratios(request: Request, background_tasks: BackgroundTasks, company: str = Query(...), timeframe: str = Query("quarterly"), variables: List[str] = Query(None), format: ResponseFormat = "records"):
+    return await _inline_or_enqueue(request, background_tasks, [("ratios", company, timeframe)], ratios_view, fetch_ratios_task, company, timeframe, variables or [], _view_format(format), format=format)
+
+@app.get("/api/ratios/compare")
+async def get_ratio_comparison(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    companies: List[str] = Query(None),
+    variables: List[str] = Query(None),
+    periods: List[str] = Query(None),
+    timeframe: str = "quarterly",
+    format: ResponseFormat = "records",
+):
+    # without an explicit company list the response depends on every company's data
+    sources = [("ratios", company, timeframe) for company in companies or []]
+    return await _inline_or_enqueue(
+        request, background_tasks, sources, ratio_comparison_view, fetch_ratio_comparison_task,
+        companies or [], variables or [], periods or [], timeframe, _view_format(format),
+        format=format,
+    )
+
+@app.get("/api/analytics")
+async def get_market_analytics(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    companies: List[str] = Query(None),
+    metrics: List[str] = Query(None),
+    timeframe: str = "quarterly",
+    window: Optional[int] = Query(None, ge=2),
+    format: ResponseFormat = "records",
+):
+    # beta is measured against every other ticker, so the result depends on the whole stocks
+    # dataset; only the monolithic layout has a single version for it
+    sources = [("stocks", "", timeframe)] if quant_reader.layout == "monolithic" else []
+    return await _inline_or_enqueue(
+        request, background_tasks, sources, market_analytics_view, fetch_market_analytics_task,
+        companies or [], metrics or [], timeframe, window, _view_format(format),
+        format=format,
+    )
 
 @app.get("/api/performance")
-async def get_performance(company: str, period: str, timeframe: str = "quarterly"):
-    task = fetch_performance_task.delay(company, period, timeframe)
-    return {"task_id": task.id}
+async def get_performance(request: Request, background_tasks: BackgroundTasks, company: str, period: str, timeframe: str = "quarterly", format: ResponseFormat = "records"):
+    return await _inline_or_enqueue(request, background_tasks, [("metrics", company, timeframe)], performance_view, fetch_performance_task, company, period, timeframe, _view_format(format), format=format)
     
 @app.get("/api/risk_matrix")
-async def get_risk_matrix(company: str, period: str, timeframe: str = "quarterly", top_n: str = "5"):
-    task = fetch_risk_matrix_task.delay(company, period, timeframe, top_n)
-    return {"task_id": task.id}
+async def get_risk_matrix(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    company: str,
+    period: str,
+    timeframe: str = "quarterly",
+    peers: RiskPeers = "period",
+    trailing: int = Query(DEFAULT_TRAILING_PERIODS, ge=1),
+):
+    sources = [("ratios", company, timeframe)]
+    if peers == "period":
+        sources.append(("universe", "", timeframe))
+    return await _inline_or_enqueue(request, background_tasks, sources, risk_matrix_view, fetch_risk_matrix_task, company, period, timeframe, peers, trailing)
+
+@app.get("/api/risk_matrix/history")
+async def get_risk_history(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    companies: List[str] = Query(None),
+    timeframe: str = "quarterly",
+    peers: Literal["period", "none"] = "period",
+    format: ResponseFormat = "records",
+):
+    # scored in one pass over the whole ratios dataset
+    return await _inline_or_enqueue(
+        request, background_tasks, [("universe", "", timeframe)], risk_history_view, fetch_risk_history_task,
+        companies or [], timeframe, peers, _view_format(format),
+        format=format,
+    )
+
+@app.get("/api/risk_matrix/drivers")
+async def get_risk_drivers(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    company: str,
+    period: str,
+    timeframe: str = "quarterly",
+    top_n: int = Query(5, ge=1),
+    method: Literal["percentile", "zscore", "minmax"] = "percentile",
+):
+    return await _inline_or_enqueue(
+        request, background_tasks, [("ratios", company, timeframe), ("universe", "", timeframe)],
+        risk_drivers_view, fetch_risk_drivers_task, company, period, timeframe, top_n, method,
+    )
+
+@app.get("/api/dashboard")
+async def get_dashboard(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    company: str,
+    period: str,
+    timeframe: str = "quarterly",
+    chart_variables: List[str] = Query(None),
+    ratio_variables: List[str] = Query(None),
+    chart_timeframe: Optional[str] = None,
+    max_points: Optional[int] = Query(None, ge=3),
+    format: ResponseFormat = "records",
+):
+    # the risk matrix ranks the company against every company of the period
+    sources = [("ratios", company, timeframe), ("metrics", company, timeframe), ("universe", "", timeframe)]
+    if chart_variables:
+        sources.append(("stocks", company, chart_timeframe or timeframe))
+    return await _inline_or_enqueue(
+        request, background_tasks, sources, dashboard_view, fetch_dashboard_task,
+        company, period, timeframe, chart_variables or [], ratio_variables or [], chart_timeframe or timeframe, max_points, _view_format(format),
+        format=format,
+    )
 
 @app.post("/api/qualitative")
 async def get_qualitative_analysis(req: QualitativeRequest):
-    task = fetch_qualitative_task.delay(req.company, req.period, req.query)
-    return {"task_id": task.id}
+    task_id = await run_in_threadpool(
+        enqueue_coalesced, fetch_qualitative_task, (req.company, req.period, req.query), qualitative_key(req.company, req.period, req.query)
+    )
+    return {"task_id": task_id}
 
 if __name__ == "__main__":
     import uvicorn
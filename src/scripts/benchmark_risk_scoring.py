@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for src/services/risk_matrix.py on synthetic ratio universes.
+
+Each universe is a ratios frame shaped like all_ratios.parquet ((company, metric) x
+period columns, metrics from RATIO_GROUPS, ~10% missing values) with N companies and
+40 quarterly periods. For every size the suite times:
+
+    single                 calculate_category_scores on one vector, no peers
+    peer_<method>          calculate_category_scores against the vector's period
+                           cross-section (prebuilt PeerDistribution)
+    batch_none             calculate_category_scores_batch over the whole panel
+    batch_<method>         the same, against the period cross-sections
+    peer_distributions     building the per-period PeerDistributions
+    sketch_distributions   building per-period SketchDistributions (k=DEFAULT_K)
+    batch_sketch           batch percentile scoring against those sketches
+    risk_cube              RiskCube.build (every normalization method)
+
+and reports throughput (scored vectors per second, median of --repeat runs) and the
+peak traced memory of one run.
+
+Timings are machine specific, so no baseline is shipped: save one with
+--save-baseline on the machine the checks run on (the default file is git-ignored).
+When a baseline exists (and --no-check is not given) the run fails with exit code 1
+when a case is more than --tolerance slower, or uses more than --tolerance extra
+memory, than the baseline. Throughput is only compared for cases whose baseline run
+takes at least --min-seconds; shorter ones are dominated by timer and scheduling noise.
+
+    python -m src.scripts.benchmark_risk_scoring --sizes 11 500 --save-baseline
+    python -m src.scripts.benchmark_risk_scoring --sizes 11 500
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.core.constants import RATIO_GROUPS
+from src.core.logger import configure_logging
+from src.services.ratio_cube import RatioCube
+from src.services.risk_cube import NORMALIZE_METHODS, RiskCube
+from src.services.risk_matrix import PeerDistribution, SketchDistribution, calculate_category_scores, calculate_category_scores_batch
+
+logger = configure_logging()
+
+DEFAULT_SIZES = (11, 500, 5000)
+DEFAULT_PERIODS = 40
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_scoring_baseline.json")
+# single-vector cases score this many vectors per run, whatever the universe size
+SINGLE_SAMPLE = 50
+
+# rough (mean, sd) of each ratio family, so transforms and ranks see realistic values
+_METRIC_SCALES = {"Valuation": (20.0, 8.0), "Profitability": (0.2, 0.1), "Liquidity": (1.5, 0.6), "Efficiency": (3.0, 1.5), "Leverage": (0.8, 0.4), "Cash Flow": (1.2, 0.5)}
+
+
+# ---------------- synthetic data ----------------
+def synthetic_ratios(n_companies: int, n_periods: int = DEFAULT_PERIODS, missing: float = 0.1, seed: int = 0) -> pd.DataFrame:
+    """Ratios frame ((company, metric) x quarter-end dates) with RATIO_GROUPS metrics."""
+    rng = np.random.default_rng(seed)
+    metrics = list(dict.fromkeys(m for mlist in RATIO_GROUPS.values() for m in mlist))
+    scales = {m: _METRIC_SCALES.get(cat, (1.0, 0.5)) for cat, mlist in RATIO_GROUPS.items() for m in mlist}
+    companies = [f"C{i:05d}" for i in range(n_companies)]
+
+    mean = np.array([scales[m][0] for m in metrics])
+    sd = np.array([scales[m][1] for m in metrics])
+    values = rng.normal(mean[None, :, None], sd[None, :, None], size=(n_companies, len(metrics), n_periods))
+    values[rng.random(values.shape) < missing] = np.nan
+
+    index = pd.MultiIndex.from_product([companies, metrics])
+    dates = pd.date_range("2015-03-31", periods=n_periods, freq="QE")
+    return pd.DataFrame(values.reshape(-1, n_periods), index=index, columns=dates)
+
+
+def universe(n_companies: int, n_periods: int) -> Tuple[RatioCube, pd.DataFrame, Dict[str, PeerDistribution]]:
+    df = synthetic_ratios(n_companies, n_periods)
+    df.columns = df.columns.to_period("Q").astype(str)
+    cube = RatioCube.from_frame(df)
+    return cube, cube.panel(), build_peers(cube)
+
+
+def build_peers(cube: RatioCube) -> Dict[str, PeerDistribution]:
+    metrics = list(cube.metrics)
+    return {period: PeerDistribution.from_values(cube.values[:, :, p], metrics) for p, period in enumerate(cube.periods)}
+
+
+def build_sketches(cube: RatioCube) -> Dict[str, SketchDistribution]:
+    metrics = list(cube.metrics)
+    return {period: SketchDistribution.from_values(cube.values[:, :, p], metrics) for p, period in enumerate(cube.periods)}
+
+
+# ---------------- measurement ----------------
+@contextlib.contextmanager
+def _quiet():
+    # the scorers log one INFO line per call
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+def measure(fn: Callable[[], Any], vectors: int, repeat: int) -> Dict[str, float]:
+    """Median throughput of `repeat` runs and the peak traced memory of one run."""
+    with _quiet():
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    seconds = float(np.median(timings))
+    return {"seconds": seconds, "vectors_per_sec": vectors / seconds if seconds > 0 else float("inf"), "peak_mib": peak / 2**20}
+
+
+def run_size(n_companies: int, n_periods: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    cube, panel, peers = universe(n_companies, n_periods)
+    rows = len(panel)
+    periods = panel.index.get_level_values("period")
+    sample = np.random.default_rng(1).choice(rows, size=min(SINGLE_SAMPLE, rows), replace=False)
+    vectors = [(panel.iloc[i], periods[i]) for i in sample]
+
+    cases: Dict[str, Tuple[Callable[[], Any], int]] = {
+        "single": (lambda: [calculate_category_scores(v, RATIO_GROUPS) for v, _ in vectors], len(vectors)),
+        "batch_none": (lambda: calculate_category_scores_batch(panel, RATIO_GROUPS), rows),
+    }
+    for method in NORMALIZE_METHODS:
+        cases[f"peer_{method}"] = (
+            lambda method=method: [calculate_category_scores(v, RATIO_GROUPS, peers_df=peers[p], normalize_method=method) for v, p in vectors],
+            len(vectors),
+        )
+        cases[f"batch_{method}"] = (
+            lambda method=method: calculate_category_scores_batch(panel, RATIO_GROUPS, peers_df=peers, peer_groups=periods, normalize_method=method),
+            rows,
+        )
+    cases["peer_distributions"] = (lambda: build_peers(cube), rows)
+    sketches = build_sketches(cube)
+    cases["sketch_distributions"] = (lambda: build_sketches(cube), rows)
+    cases["batch_sketch"] = (lambda: calculate_category_scores_batch(panel, RATIO_GROUPS, peers_df=sketches, peer_groups=periods), rows)
+    cases["risk_cube"] = (lambda: RiskCube.build(cube, RATIO_GROUPS, peers), rows)
+
+    results = {}
+    for name, (fn, vectors_per_run) in cases.items():
+        results[name] = measure(fn, vectors_per_run, repeat)
+        logger.info(
+            "%5d companies  %-20s %12.0f vectors/s  %8.1f MiB peak",
+            n_companies, name, results[name]["vectors_per_sec"], results[name]["peak_mib"],
+        )
+    return results
+
+
+# ---------------- baseline ----------------
+def regressions(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float, min_seconds: float = 0.0
+) -> List[str]:
+    """
+    Cases slower or hungrier than the baseline by more than `tolerance` (cases missing
+    from it are skipped). Throughput is only compared when the baseline run took at
+    least `min_seconds`.
+    """
+    failures = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        timed = base["seconds"] >= min_seconds
+        if timed and result["vectors_per_sec"] < base["vectors_per_sec"] * (1.0 - tolerance):
+            failures.append(f"{key}: {result['vectors_per_sec']:.0f} vectors/s vs baseline {base['vectors_per_sec']:.0f}")
+        if result["peak_mib"] > base["peak_mib"] * (1.0 + tolerance) + 1.0:
+            failures.append(f"{key}: {result['peak_mib']:.1f} MiB peak vs baseline {base['peak_mib']:.1f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="universe sizes (companies)")
+    parser.add_argument("--periods", type=int, default=DEFAULT_PERIODS)
+    parser.add_argument("--repeat", type=int, default=7, help="timed runs per case (the median is kept)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (default: %(default)s)")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="shortest baseline run whose throughput is compared (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline instead of checking")
+    parser.add_argument("--no-check", action="store_true", help="only report")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for size in args.sizes:
+        for name, result in run_size(size, args.periods, args.repeat).items():
+            results[f"{size}x{args.periods}/{name}"] = result
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        logger.info("Saved baseline of %d cases to %s", len(results), args.baseline)
+        return
+
+    if args.no_check:
+        return
+    if not os.path.exists(args.baseline):
+        logger.info("No baseline at %s; run with --save-baseline on this machine to enable the check", args.baseline)
+        return
+
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    failures = regressions(results, baseline, args.tolerance, args.min_seconds)
+    for failure in failures:
+        logger.error("REGRESSION %s", failure)
+    if failures:
+        sys.exit(1)
+    logger.info("No regressions against %s (tolerance %.0f%%)", args.baseline, 100 * args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
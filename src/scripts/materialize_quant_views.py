@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Precompute the ratios, performance and risk_matrix payloads of every company into
+Redis (see src/services/quant_materialized.py). Entries are only rebuilt when the
+dataset versions they were built from change, so the loop is cheap when nothing did.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+from src.core.logger import configure_logging
+from src.services.dataset_cache import DatasetCache
+from src.services.quant_materialized import QUANT_VIEWS_REDIS_URL, QUANT_VIEWS_REFRESH_SECONDS, MaterializedViews
+from src.services.quant_reader import AZURE_BASE, QuantDataReader
+
+load_dotenv()
+logger = configure_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base", default=AZURE_BASE, help="dataset root (default: %(default)s)")
+    parser.add_argument("--redis-url", default=QUANT_VIEWS_REDIS_URL, help="Redis for the materialized views (QUANT_VIEWS_REDIS_URL)")
+    parser.add_argument("--timeframes", nargs="+", default=["quarterly", "yearly"])
+    parser.add_argument("--companies", nargs="+", help="with --once, only these companies (default: every company in the ratios dataset)")
+    parser.add_argument("--interval", type=float, default=QUANT_VIEWS_REFRESH_SECONDS, help="seconds between refreshes")
+    parser.add_argument("--force", action="store_true", help="with --once, rebuild even when the dataset versions are unchanged")
+    parser.add_argument("--once", action="store_true", help="refresh once and exit")
+    args = parser.parse_args()
+
+    storage_options = {"connection_string": os.getenv("AZURE_STORAGE_CONNECTION_STRING")} if args.base.startswith("az://") else {}
+    # versions are compared on every pass, so never trust a stale cached one
+    reader = QuantDataReader(DatasetCache(revalidate_after=0, storage_options=storage_options), storage_options=storage_options, base=args.base)
+    views = MaterializedViews(reader, url=args.redis_url)
+
+    if args.once:
+        for timeframe in args.timeframes:
+            logger.info("Materialized views (%s): %s", timeframe, views.refresh(timeframe, args.companies, force=args.force))
+        return
+    views.run_forever(args.timeframes, args.interval)
+
+
+if __name__ == "__main__":
+    main()
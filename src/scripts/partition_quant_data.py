@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Rewrite the monolithic quant parquet files into the company-partitioned layout.
+
+    stocks/{tf}/{tf}.parquet            -> partitioned/stocks/timeframe={tf}/company={c}/part-0.parquet
+    ratios/{tf}/all_ratios.parquet      -> partitioned/ratios/timeframe={tf}/company={c}/part-0.parquet
+    metrics/{tf}/all_metrics.parquet    -> partitioned/metrics/timeframe={tf}/company={c}/part-0.parquet
+
+Set QUANT_DATA_LAYOUT=partitioned for the Celery workers once the conversion has run.
+"""
+import argparse
+import os
+from typing import Callable, Dict, Iterator, Tuple
+
+import fsspec
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.core.logger import configure_logging
+from src.services.quant_partitions import (
+    DEFAULT_ROW_GROUP_SIZE,
+    partition_dir,
+    split_metrics,
+    split_ratios,
+    split_stocks,
+    write_partition,
+)
+from src.services.quant_reader import AZURE_BASE, metrics_path, ratios_path, stocks_path
+
+load_dotenv()
+logger = configure_logging()
+
+Splitter = Callable[[pd.DataFrame], Iterator[Tuple[str, pd.DataFrame]]]
+
+DATASETS: Dict[str, Tuple[Callable[[str, str], str], Splitter]] = {
+    "stocks": (stocks_path, split_stocks),
+    "ratios": (ratios_path, split_ratios),
+    "metrics": (metrics_path, split_metrics),
+}
+
+
+def partition_dataset(kind: str, timeframe: str, base: str, storage_options: dict, row_group_size: int) -> int:
+    """Convert one dataset/timeframe; returns the number of company partitions written."""
+    source_path_fn, splitter = DATASETS[kind]
+    source = source_path_fn(timeframe, base)
+    fs, _ = fsspec.core.url_to_fs(source, **storage_options)
+
+    try:
+        df = pd.read_parquet(source, storage_options=storage_options)
+    except FileNotFoundError:
+        logger.warning("Source dataset missing, skipping: %s", source)
+        return 0
+
+    written = 0
+    for company, part in splitter(df):
+        target_dir = partition_dir(kind, timeframe, company, base)
+        _, target_fs_dir = fsspec.core.url_to_fs(target_dir, **storage_options)
+        fs.makedirs(target_fs_dir, exist_ok=True)
+        write_partition(part, f"{target_fs_dir}/part-0.parquet", fs, row_group_size=row_group_size)
+        written += 1
+
+    logger.info("Partitioned %s (%s) into %d company partitions", kind, timeframe, written)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default=AZURE_BASE, help="dataset root (default: %(default)s)")
+    parser.add_argument("--datasets", nargs="+", default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument("--timeframes", nargs="+", default=["quarterly", "yearly"])
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE, help="periods per row group")
+    args = parser.parse_args()
+
+    storage_options = {"connection_string": os.getenv("AZURE_STORAGE_CONNECTION_STRING")} if args.base.startswith("az://") else {}
+
+    for kind in args.datasets:
+        for timeframe in args.timeframes:
+            try:
+                partition_dataset(kind, timeframe, args.base, storage_options, args.row_group_size)
+            except Exception:
+                logger.exception("Failed to partition %s (%s)", kind, timeframe)
+
+
+if __name__ == "__main__":
+    main()
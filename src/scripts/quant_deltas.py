@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Publish and compact delta fragments of the quant datasets (see src/services/quant_deltas.py).
+
+    publish  write a local parquet file holding only the new (or restated) periods as a
+             delta fragment; it has the same shape as the base file it extends
+    compact  fold every delta fragment back into its base file and delete the fragments
+    check    compare the monolithic and partitioned reads of the datasets (e.g. after the
+             same delta was published to, or compacted in, both layouts); exits with
+             status 1 when they disagree
+
+Both commands follow QUANT_DATA_LAYOUT: monolithic fragments sit in
+{dataset}/{tf}/deltas/<base name>/, partitioned ones are extra part-{stamp}.parquet
+files inside each company partition.
+"""
+import argparse
+import os
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+import fsspec
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.core.logger import configure_logging
+from src.services.dataset_cache import DatasetCache
+from src.services.quant_deltas import delta_dir, fragment_stamp, list_fragments, merge_fragments
+from src.services.quant_partitions import (
+    DEFAULT_ROW_GROUP_SIZE,
+    dataset_root,
+    drop_empty_periods,
+    merge_partition_rows,
+    partition_dir,
+    split_metrics,
+    split_ratios,
+    split_stocks,
+    write_partition,
+)
+from src.services.quant_reader import AZURE_BASE, MONOLITHIC_PATHS, QUANT_DATA_LAYOUT, TIMEFRAME_FREQ, QuantDataReader
+
+load_dotenv()
+logger = configure_logging()
+
+SPLITTERS = {"stocks": split_stocks, "ratios": split_ratios, "metrics": split_metrics}
+
+
+def _read(fs, fs_path: str) -> pd.DataFrame:
+    with fs.open(fs_path, "rb") as fh:
+        return pd.read_parquet(fh)
+
+
+def _write(df: pd.DataFrame, fs, fs_path: str) -> None:
+    with fs.open(fs_path, "wb") as fh:
+        df.to_parquet(fh)
+
+
+# ---------------- monolithic ----------------
+def publish_monolithic(kind: str, timeframe: str, frame: pd.DataFrame, base: str, storage_options: dict) -> str:
+    target_dir = delta_dir(MONOLITHIC_PATHS[kind](timeframe, base))
+    fs, fs_dir = fsspec.core.url_to_fs(target_dir, **storage_options)
+    fs.makedirs(fs_dir, exist_ok=True)
+    target = f"{fs_dir}/delta-{fragment_stamp()}.parquet"
+    _write(frame, fs, target)
+    return target
+
+
+def compact_monolithic(kind: str, timeframe: str, base: str, storage_options: dict) -> int:
+    """Rewrite the base file with its fragments merged in; returns the number of fragments folded."""
+    base_path = MONOLITHIC_PATHS[kind](timeframe, base)
+    fs, fs_base = fsspec.core.url_to_fs(base_path, **storage_options)
+    _, fs_dir = fsspec.core.url_to_fs(delta_dir(base_path), **storage_options)
+    fragments = list_fragments(fs, fs_dir)
+    if not fragments:
+        return 0
+
+    merged = merge_fragments(kind, [_read(fs, fs_base)] + [_read(fs, f) for f in fragments])
+    # the base is replaced before the fragments are removed; a reader in between merges
+    # the same fragments into the new base and gets the same result
+    _write(merged, fs, fs_base)
+    fs.rm(fragments)
+    return len(fragments)
+
+
+# ---------------- partitioned ----------------
+def publish_partitioned(kind: str, timeframe: str, frame: pd.DataFrame, base: str, storage_options: dict, row_group_size: int) -> int:
+    if kind == "ratios":
+        # a delta usually holds a single quarter, too few dates to infer the frequency from
+        parts = split_ratios(frame, freq=TIMEFRAME_FREQ.get(timeframe))
+    else:
+        parts = SPLITTERS[kind](frame)
+    stamp = fragment_stamp()
+    written = 0
+    for company, part in parts:
+        # empty cells of the delta mean "no new value": all-empty periods are not written
+        part = drop_empty_periods(part)
+        if part.empty:
+            continue
+        fs, fs_dir = fsspec.core.url_to_fs(partition_dir(kind, timeframe, company, base), **storage_options)
+        fs.makedirs(fs_dir, exist_ok=True)
+        write_partition(part, f"{fs_dir}/part-{stamp}.parquet", fs, row_group_size=row_group_size)
+        written += 1
+    return written
+
+
+def compact_partitioned(kind: str, timeframe: str, base: str, storage_options: dict, row_group_size: int) -> int:
+    """Fold each partition's fragments into part-0; returns the number of fragments folded."""
+    root = f"{dataset_root(kind, base)}/timeframe={timeframe}"
+    fs, fs_root = fsspec.core.url_to_fs(root, **storage_options)
+    if not fs.exists(fs_root):
+        return 0
+
+    folded = 0
+    for fs_dir in fs.ls(fs_root, detail=False):
+        files = list_fragments(fs, fs_dir)
+        if len(files) <= 1:
+            continue
+        parts = [_read(fs, f) for f in files]
+        # part-0 sorts first, later fragments' values win for restated periods
+        merged = merge_partition_rows(pd.concat(parts, ignore_index=True))
+        write_partition(merged, f"{fs_dir}/part-0.parquet", fs, row_group_size=row_group_size)
+        stale = [f for f in files if not f.endswith("/part-0.parquet")]
+        fs.rm(stale)
+        folded += len(stale)
+    return folded
+
+
+# ---------------- layout check ----------------
+def _differences(name: str, a: pd.DataFrame, b: pd.DataFrame) -> List[str]:
+    """Cells where two frames disagree; labels missing on one side count as empty."""
+    a, b = a.copy(), b.copy()
+    for frame in (a, b):
+        frame.columns = frame.columns.map(str)
+    rows, cols = a.index.union(b.index), a.columns.union(b.columns)
+    left = a.reindex(index=rows, columns=cols).to_numpy(dtype=float)
+    right = b.reindex(index=rows, columns=cols).to_numpy(dtype=float)
+    same = (left == right) | (np.isnan(left) & np.isnan(right))
+    return [f"{name} {rows[i]} {cols[j]}: {left[i, j]} vs {right[i, j]}" for i, j in zip(*np.nonzero(~same))]
+
+
+def layout_differences(kind: str, timeframe: str, base: str, storage_options: dict) -> List[str]:
+    """Where the monolithic and partitioned reads of one dataset disagree (empty when they match)."""
+    monolithic, partitioned = (
+        QuantDataReader(DatasetCache(revalidate_after=0, storage_options=storage_options), storage_options=storage_options, base=base, layout=layout, mirror_dir="")
+        for layout in ("monolithic", "partitioned")
+    )
+    if kind == "ratios":
+        frames = []
+        for reader in (monolithic, partitioned):
+            cube = reader.ratio_cube(timeframe)
+            index = pd.MultiIndex.from_product([cube.companies, cube.metrics])
+            frames.append(pd.DataFrame(cube.values.reshape(-1, len(cube.periods)), index=index, columns=cube.periods))
+        return _differences(f"ratios/{timeframe}", *frames)
+    if kind == "stocks":
+        return _differences(f"stocks/{timeframe}", monolithic.price_panel(timeframe), partitioned.price_panel(timeframe))
+
+    out = []
+    for company in sorted(set(monolithic.companies(timeframe, "metrics")) | set(partitioned.companies(timeframe, "metrics"))):
+        frames = [reader.company_metrics(company, timeframe) for reader in (monolithic, partitioned)]
+        for frame in frames:
+            frame.index = frame.index.astype(str)
+        out += _differences(f"metrics/{timeframe} {company}", *frames)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["publish", "compact", "check"])
+    parser.add_argument("--base", default=AZURE_BASE, help="dataset root (default: %(default)s)")
+    parser.add_argument("--layout", default=QUANT_DATA_LAYOUT, choices=["monolithic", "partitioned"])
+    parser.add_argument("--datasets", nargs="+", default=list(MONOLITHIC_PATHS), choices=list(MONOLITHIC_PATHS))
+    parser.add_argument("--timeframes", nargs="+", default=["quarterly", "yearly"])
+    parser.add_argument("--file", help="publish: local parquet file with the new periods (one dataset and timeframe)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE, help="periods per row group (partitioned)")
+    args = parser.parse_args()
+
+    storage_options = {"connection_string": os.getenv("AZURE_STORAGE_CONNECTION_STRING")} if args.base.startswith("az://") else {}
+
+    if args.command == "publish":
+        if not args.file or len(args.datasets) != 1 or len(args.timeframes) != 1:
+            parser.error("publish needs --file and exactly one --datasets and --timeframes value")
+        kind, timeframe = args.datasets[0], args.timeframes[0]
+        frame = pd.read_parquet(args.file)
+        if args.layout == "partitioned":
+            written = publish_partitioned(kind, timeframe, frame, args.base, storage_options, args.row_group_size)
+            logger.info("Published %s (%s) delta to %d partitions", kind, timeframe, written)
+        else:
+            target = publish_monolithic(kind, timeframe, frame, args.base, storage_options)
+            logger.info("Published %s (%s) delta %s", kind, timeframe, target)
+        return
+
+    if args.command == "check":
+        failures = 0
+        for kind in args.datasets:
+            for timeframe in args.timeframes:
+                differences = layout_differences(kind, timeframe, args.base, storage_options)
+                for line in differences[:20]:
+                    logger.error("LAYOUT MISMATCH %s", line)
+                if differences:
+                    failures += 1
+                logger.info("%s (%s): %d differing cells between layouts", kind, timeframe, len(differences))
+        if failures:
+            sys.exit(1)
+        return
+
+    counts: Dict[str, int] = {}
+    for kind in args.datasets:
+        for timeframe in args.timeframes:
+            try:
+                if args.layout == "partitioned":
+                    counts[f"{kind}/{timeframe}"] = compact_partitioned(kind, timeframe, args.base, storage_options, args.row_group_size)
+                else:
+                    counts[f"{kind}/{timeframe}"] = compact_monolithic(kind, timeframe, args.base, storage_options)
+            except Exception:
+                logger.exception("Failed to compact %s (%s)", kind, timeframe)
+    logger.info("Compacted fragments: %s", counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Background process that keeps the local Arrow mirror of the quant datasets in sync
+with Azure. Run one per node, sharing QUANT_MIRROR_DIR with the Celery workers.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+from src.core.logger import configure_logging
+from src.services.quant_mirror import QUANT_MIRROR_DIR, QUANT_MIRROR_INTERVAL_SECONDS, QuantMirror
+from src.services.quant_reader import AZURE_BASE
+
+load_dotenv()
+logger = configure_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base", default=AZURE_BASE, help="dataset root (default: %(default)s)")
+    parser.add_argument("--mirror-dir", default=QUANT_MIRROR_DIR, help="local mirror directory (QUANT_MIRROR_DIR)")
+    parser.add_argument("--interval", type=float, default=QUANT_MIRROR_INTERVAL_SECONDS, help="seconds between syncs")
+    parser.add_argument("--once", action="store_true", help="sync once and exit")
+    args = parser.parse_args()
+
+    storage_options = {"connection_string": os.getenv("AZURE_STORAGE_CONNECTION_STRING")} if args.base.startswith("az://") else {}
+    mirror = QuantMirror(args.base, args.mirror_dir, storage_options=storage_options)
+
+    if args.once:
+        logger.info("Mirror sync: %s", mirror.sync())
+        return
+    mirror.run_forever(args.interval)
+
+
+if __name__ == "__main__":
+    main()
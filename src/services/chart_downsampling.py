@@ -0,0 +1,139 @@
+"""
+Server-side downsampling for the stock charts.
+
+- Line series are reduced with Largest-Triangle-Three-Buckets (LTTB), which keeps
+  the visual shape (peaks, troughs) of a long series with far fewer points.
+- Candlestick data is aggregated as true OHLC bars (first open, max high, min low,
+  last close, summed volume), never by picking individual rows.
+
+Resolution pyramids (stored resolution -> weekly -> monthly) are built with the same
+aggregations, so a chart can pick the finest level that fits its point budget.
+"""
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+OHLC_VARIABLES = ("Open", "High", "Low", "Close")
+
+# level name -> pandas resample rule; "base" is the stored resolution
+# (daily for the daily stocks dataset)
+PYRAMID_LEVELS: Tuple[Tuple[str, Union[str, None]], ...] = (
+    ("base", None),
+    ("weekly", "W-FRI"),
+    ("monthly", "ME"),
+)
+
+
+def _compound(returns: pd.Series) -> float:
+    values = returns.dropna().to_numpy(dtype=float)
+    return float(np.prod(1.0 + values) - 1.0) if values.size else np.nan
+
+
+# how each chart variable aggregates into a coarser bar
+AGGREGATIONS: Dict[str, object] = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Adj Close": "last",
+    "Volume": "sum",
+    "Dividends": "sum",
+    "Return": _compound,
+    "Cumulative Return": "last",
+    "Volatility": "mean",
+}
+
+
+def is_candlestick(variables: Sequence[str]) -> bool:
+    """Same rule as the frontend: a candle chart is exactly the four OHLC variables."""
+    return len(variables) == 4 and set(variables) == set(OHLC_VARIABLES)
+
+
+def _agg_spec(columns: Sequence[str]) -> Dict[str, object]:
+    return {c: AGGREGATIONS.get(c, "last") for c in columns}
+
+
+def resample_level(frame: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """
+    Aggregate a DatetimeIndex frame (one column per variable) into `rule` bars.
+    Each bar is labelled with the first real timestamp it contains.
+    """
+    out = frame.resample(rule).agg(_agg_spec(frame.columns))
+    first_seen = pd.Series(frame.index, index=frame.index).resample(rule).first()
+    out.index = pd.DatetimeIndex(first_seen.values)
+    # calendar buckets without any rows (e.g. holiday weeks) have no first timestamp
+    return out[out.index.notna()]
+
+
+def bucket_ohlc(frame: pd.DataFrame, n_buckets: int) -> pd.DataFrame:
+    """Aggregate consecutive rows into at most `n_buckets` equal-count OHLC bars."""
+    if n_buckets <= 0 or len(frame) <= n_buckets:
+        return frame
+    bucket_ids = np.arange(len(frame)) * n_buckets // len(frame)
+    grouped = frame.groupby(bucket_ids)
+    out = grouped.agg(_agg_spec(frame.columns))
+    out.index = pd.DatetimeIndex([frame.index[i] for i in np.flatnonzero(np.diff(bucket_ids, prepend=-1))])
+    return out
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Row positions selected by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between contributes
+    the point forming the largest triangle with the previously selected point and the
+    average of the next bucket. NaNs in `y` are treated as 0 for the area computation.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    selected: List[int] = [0]
+    bucket_size = (n - 2) / (n_out - 2)
+    a = 0
+
+    for i in range(n_out - 2):
+        start = int(np.floor(i * bucket_size)) + 1
+        end = min(int(np.floor((i + 1) * bucket_size)) + 1, n - 1)
+
+        next_start = end
+        next_end = min(int(np.floor((i + 2) * bucket_size)) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+
+    selected.append(n - 1)
+    return np.asarray(selected)
+
+
+def lttb(frame: pd.DataFrame, n_out: int) -> pd.DataFrame:
+    """
+    LTTB-downsample a DatetimeIndex frame to `n_out` rows. Points are chosen on the
+    first column, and every column is taken from those rows so records stay aligned.
+    """
+    if len(frame) <= n_out or frame.empty:
+        return frame
+    x = frame.index.asi8.astype(float)
+    idx = lttb_indices(x, frame.iloc[:, 0].to_numpy(dtype=float), n_out)
+    return frame.iloc[idx]
+
+
+def downsample(levels: Dict[str, pd.DataFrame], variables: Sequence[str], max_points: int) -> pd.DataFrame:
+    """
+    Pick the finest pyramid level with at most `max_points` rows. If even the coarsest
+    level is longer, reduce it further: OHLC buckets for candles, LTTB for lines.
+    """
+    ordered = [levels[name] for name, _ in PYRAMID_LEVELS if name in levels]
+    for frame in ordered:
+        if len(frame) <= max_points:
+            return frame
+    coarsest = ordered[-1]
+    return bucket_ohlc(coarsest, max_points) if is_candlestick(variables) else lttb(coarsest, max_points)
@@ -0,0 +1,215 @@
+"""
+In-process cache for the quant parquet datasets stored in Azure Blob Storage.
+
+Each Celery worker process keeps one DatasetCache. Entries are keyed by blob path
+(plus an optional variant describing how the frame was read) and tagged with the
+blob's ETag / last-modified version, so a cheap metadata request is enough to
+decide whether a cached frame can be reused.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import fsspec
+import pandas as pd
+import pyarrow as pa
+
+from src.core.logger import configure_logging
+
+logger = configure_logging()
+
+QUANT_CACHE_MAX_MB = int(os.getenv("QUANT_CACHE_MAX_MB", 512))
+QUANT_CACHE_REVALIDATE_SECONDS = float(os.getenv("QUANT_CACHE_REVALIDATE_SECONDS", 30))
+
+
+class CacheMiss(LookupError):
+    """Raised by get(..., cached_only=True) when serving the frame would need I/O."""
+
+
+@dataclass
+class _CacheEntry:
+    frame: pd.DataFrame
+    version: str
+    nbytes: int
+
+
+def blob_version(info: Dict[str, Any]) -> str:
+    """Version token from an fsspec info dict: ETag, else last-modified, else size."""
+    for key in ("etag", "ETag", "last_modified", "mtime"):
+        if info.get(key):
+            return str(info[key])
+    return str(info.get("size", ""))
+
+
+def _frame_nbytes(frame: pd.DataFrame) -> int:
+    """Approximate in-memory footprint of a frame, including index and object columns."""
+    if isinstance(frame, dict):
+        # e.g. per-period peer distributions
+        return sum(_frame_nbytes(value) for value in frame.values())
+    if isinstance(frame, pa.Table):
+        # memory-mapped mirror tables (see QuantDataReader._mapped) live in the page
+        # cache shared between processes, not in the process heap
+        return 0
+    if not isinstance(frame, pd.DataFrame):
+        # derived structures (e.g. RatioCube) report their own size
+        return int(getattr(frame, "nbytes", 0))
+    try:
+        return int(frame.memory_usage(deep=True, index=True).sum())
+    except Exception:
+        return int(frame.values.nbytes)
+
+
+class DatasetCache:
+    """
+    LRU cache of decoded DataFrames with a memory ceiling and blob revalidation.
+
+    - get(path, loader) returns the cached frame when the blob version is unchanged,
+      otherwise calls loader(path) and stores the result.
+    - Blob versions are looked up at most once per `revalidate_after` seconds per path.
+    - Least recently used entries are evicted once `max_bytes` is exceeded.
+
+    Cached frames are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = QUANT_CACHE_MAX_MB * 1024 * 1024,
+        revalidate_after: float = QUANT_CACHE_REVALIDATE_SECONDS,
+        storage_options: Optional[Dict[str, Any]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.storage_options = storage_options or {}
+        self._entries: "OrderedDict[Tuple[str, Hashable], _CacheEntry]" = OrderedDict()
+        self._versions: Dict[str, Tuple[str, float]] = {}
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.RLock()
+
+    # ---------------- blob versions ----------------
+    def _fetch_version(self, path: str) -> str:
+        """
+        Read the blob's ETag (or last-modified / size) with a metadata-only request.
+
+        For a directory (e.g. one company partition) the version combines the names and
+        versions of the files directly inside it. A path that does not exist has the
+        empty version "".
+        """
+        fs, fs_path = fsspec.core.url_to_fs(path, **self.storage_options)
+        # adlfs keeps a listing cache; drop it so we see the current blob properties
+        fs.invalidate_cache(fs_path)
+        try:
+            info = fs.info(fs_path)
+        except FileNotFoundError:
+            return ""
+        if info.get("type") == "directory":
+            files = sorted(fs.ls(fs_path, detail=True), key=lambda f: f["name"])
+            token = "|".join(f"{f['name']}@{blob_version(f)}" for f in files if f.get("type") != "directory")
+            return hashlib.sha1(token.encode("utf-8")).hexdigest()
+        return blob_version(info)
+
+    def version(self, path: str, cached_only: bool = False) -> str:
+        """
+        Current version token of `path`, revalidated at most every `revalidate_after` seconds.
+        With cached_only=True, CacheMiss is raised instead of revalidating.
+        """
+        if cached_only:
+            version = self._known_version(path)
+            if version is None:
+                raise CacheMiss(path)
+            return version
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(path)
+            if cached is not None and now - cached[1] < self.revalidate_after:
+                return cached[0]
+        version = self._fetch_version(path)
+        with self._lock:
+            self._versions[path] = (version, now)
+        return version
+
+    def _known_version(self, path: str) -> Optional[str]:
+        """Version of `path` if it was revalidated recently enough to trust without I/O."""
+        with self._lock:
+            cached = self._versions.get(path)
+            if cached is not None and time.monotonic() - cached[1] < self.revalidate_after:
+                return cached[0]
+        return None
+
+    # ---------------- cache access ----------------
+    def get(
+        self,
+        path: str,
+        loader: Callable[[str], pd.DataFrame],
+        variant: Hashable = None,
+        cached_only: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Return the frame for (path, variant), loading it with `loader` on a miss or a stale version.
+
+        With cached_only=True nothing is fetched: CacheMiss is raised unless a fresh entry
+        is already in memory.
+        """
+        key = (path, variant)
+        version = self._known_version(path) if cached_only else self.version(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and version is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry.frame
+            self._misses += 1
+
+        if cached_only:
+            raise CacheMiss(key)
+
+        frame = loader(path)
+        self._store(key, frame, version)
+        return frame
+
+    def _store(self, key: Tuple[str, Hashable], frame: pd.DataFrame, version: str) -> None:
+        nbytes = _frame_nbytes(frame)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old.nbytes
+
+            if nbytes > self.max_bytes:
+                logger.warning("Dataset %s (%d bytes) exceeds cache ceiling; not cached", key[0], nbytes)
+                return
+
+            self._entries[key] = _CacheEntry(frame=frame, version=version, nbytes=nbytes)
+            self._total_bytes += nbytes
+
+            while self._total_bytes > self.max_bytes and self._entries:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+                logger.info("Evicted dataset %s from cache (%d bytes)", evicted_key[0], evicted.nbytes)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop every entry for `path`, or the whole cache when no path is given."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._versions.clear()
+                self._total_bytes = 0
+                return
+            for key in [k for k in self._entries if k[0] == path]:
+                self._total_bytes -= self._entries.pop(key).nbytes
+            self._versions.pop(path, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
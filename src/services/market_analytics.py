@@ -0,0 +1,67 @@
+"""
+Rolling market analytics over the stocks dataset.
+
+Everything is computed on the whole price panel (date x company) at once with
+vectorized pandas window operations, so adding tickers does not add Python loops:
+
+- rolling_return: price change over the window
+- volatility: annualized standard deviation of period returns over the window
+- drawdown: distance from the running price peak
+- max_drawdown: worst drawdown seen so far
+- beta: rolling beta against the equal-weighted peer set (all other tickers)
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+ANALYTICS_METRICS = ("rolling_return", "volatility", "drawdown", "max_drawdown", "beta")
+
+PERIODS_PER_YEAR = {"daily": 252, "weekly": 52, "monthly": 12, "quarterly": 4, "yearly": 1}
+# default rolling window, roughly one year (three for yearly data)
+DEFAULT_WINDOWS = {"daily": 252, "weekly": 52, "monthly": 12, "quarterly": 4, "yearly": 3}
+
+
+def default_window(timeframe: str) -> int:
+    return DEFAULT_WINDOWS.get(timeframe, 4)
+
+
+def peer_returns(returns: pd.DataFrame) -> pd.DataFrame:
+    """Equal-weighted mean return of every other ticker, per date and ticker (leave-one-out)."""
+    total = returns.sum(axis=1, min_count=1)
+    count = returns.count(axis=1)
+    others = count.to_numpy()[:, None] - returns.notna().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peers = (total.to_numpy()[:, None] - returns.fillna(0.0).to_numpy()) / others
+    peers[others <= 0] = np.nan
+    return pd.DataFrame(peers, index=returns.index, columns=returns.columns)
+
+
+def rolling_beta(returns: pd.DataFrame, benchmark: pd.DataFrame, window: int) -> pd.DataFrame:
+    """Column-wise rolling cov(r, b) / var(b), from rolling means of the products."""
+    mean_r = returns.rolling(window).mean()
+    mean_b = benchmark.rolling(window).mean()
+    cov = (returns * benchmark).rolling(window).mean() - mean_r * mean_b
+    var = (benchmark * benchmark).rolling(window).mean() - mean_b * mean_b
+    return cov / var.where(var > 0)
+
+
+def compute_analytics(prices: pd.DataFrame, window: int, periods_per_year: Optional[int] = None) -> pd.DataFrame:
+    """
+    Analytics frame for a date x company price panel: DatetimeIndex rows and
+    (metric, company) columns, one block per name in ANALYTICS_METRICS.
+    """
+    prices = prices.sort_index().astype(float)
+    returns = prices.pct_change(fill_method=None)
+    drawdown = prices / prices.cummax() - 1.0
+    scale = np.sqrt(periods_per_year) if periods_per_year else 1.0
+
+    blocks: Dict[str, pd.DataFrame] = {
+        "rolling_return": prices / prices.shift(window) - 1.0,
+        "volatility": returns.rolling(window).std() * scale,
+        "drawdown": drawdown,
+        "max_drawdown": drawdown.cummin(),
+        "beta": rolling_beta(returns, peer_returns(returns), window),
+    }
+    out = pd.concat(blocks, axis=1, names=["metric", "company"])
+    return out.replace([np.inf, -np.inf], np.nan)
@@ -0,0 +1,68 @@
+"""
+Period catalog shared by the quant endpoints.
+
+The UI and the knowledge graph name periods 'Q1_2024' (quarter) and 'FY_2024' or
+'2024' (fiscal year), while the datasets are labelled by pandas periods ('2024Q1',
+'2024'). period_label() normalizes any of these spellings to the dataset label, and a
+PeriodCatalog maps labels to the integer positions of one company frame's periods, so
+performance and risk requests slice by position instead of scanning or relabelling.
+"""
+import re
+from typing import Dict, List, Optional, Sequence
+
+_QUARTER_UI = re.compile(r"^Q([1-4])[_\s-]?(\d{4})$", re.IGNORECASE)
+_QUARTER_LABEL = re.compile(r"^(\d{4})[_\s-]?Q([1-4])$", re.IGNORECASE)
+_YEAR = re.compile(r"^(?:FY[_\s-]?)?(\d{4})$", re.IGNORECASE)
+
+
+def period_label(period: str) -> str:
+    """
+    Dataset period label of a UI / graph period:
+
+        'Q1_2024', 'Q1 2024', '2024Q1' -> '2024Q1'
+        'FY_2024', '2024'             -> '2024'
+
+    Unrecognized strings are returned unchanged (and simply won't be found).
+    """
+    period = str(period).strip()
+    match = _QUARTER_UI.match(period)
+    if match:
+        return f"{match.group(2)}Q{match.group(1)}"
+    match = _QUARTER_LABEL.match(period)
+    if match:
+        return f"{match.group(1)}Q{match.group(2)}"
+    match = _YEAR.match(period)
+    if match:
+        return match.group(1)
+    return period
+
+
+class PeriodCatalog:
+    """Period label -> integer position along the period axis of one company frame."""
+
+    def __init__(self, labels: Sequence[str]):
+        self.labels: List[str] = [str(label) for label in labels]
+        self._positions: Dict[str, int] = {}
+        for pos, label in enumerate(self.labels):
+            self._positions.setdefault(label, pos)
+
+    @property
+    def nbytes(self) -> int:
+        # rough size for the DatasetCache budget
+        return 64 * len(self.labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, period: str) -> bool:
+        return period_label(period) in self._positions
+
+    def get(self, period: str) -> Optional[int]:
+        """Position of `period` in any accepted spelling, or None when the frame does not have it."""
+        return self._positions.get(period_label(period))
+
+    def position(self, period: str) -> int:
+        pos = self.get(period)
+        if pos is None:
+            raise KeyError(period_label(period))
+        return pos
@@ -0,0 +1,66 @@
+"""
+Append-only delta fragments for the quant datasets.
+
+Publishing a new quarter no longer rewrites the base files. The new periods land as a
+small parquet fragment next to the base file:
+
+    ratios/{tf}/all_ratios.parquet                      (base)
+    ratios/{tf}/deltas/all_ratios/delta-{stamp}.parquet  (fragments, same shape as the base)
+
+and, with the partitioned layout, as an extra file in each company partition:
+
+    partitioned/ratios/timeframe={tf}/company={c}/part-{stamp}.parquet
+
+Readers merge base and fragments in name (= publish) order, so values in a later
+fragment that restates a period win. Each fragment is cached on its own, so after a
+publish a warm reader only loads the new fragment. src/scripts/quant_deltas.py
+compacts the fragments back into the base.
+"""
+import posixpath
+from datetime import datetime, timezone
+from typing import List, Sequence
+
+import pandas as pd
+
+DELTA_DIR = "deltas"
+DELTA_SUFFIXES = (".parquet", ".arrow")
+
+
+def delta_dir(base_path: str) -> str:
+    """Directory holding the delta fragments of a monolithic base file."""
+    parent, name = posixpath.split(base_path)
+    return f"{parent}/{DELTA_DIR}/{posixpath.splitext(name)[0]}"
+
+
+def fragment_stamp() -> str:
+    """Sortable UTC timestamp used to name fragments in publish order."""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+
+
+def is_fragment(name: str) -> bool:
+    base = posixpath.basename(name.rstrip("/"))
+    # dot-prefixed files are temporary (e.g. mirror writes in progress)
+    return not base.startswith(".") and base.endswith(DELTA_SUFFIXES)
+
+
+def list_fragments(fs, fs_dir: str) -> List[str]:
+    """Fragment paths (filesystem-relative) inside `fs_dir`, in publish order."""
+    if not fs.exists(fs_dir):
+        return []
+    return sorted(name for name in fs.ls(fs_dir, detail=False) if is_fragment(name))
+
+
+def merge_fragments(kind: str, frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Overlay delta frames (in publish order) on a base frame: a later frame's non-null
+    cells win, and its new rows/columns are appended. ratios frames hold one column
+    per period, stocks and metrics one row per period; the period axis is re-sorted.
+    """
+    out = frames[0]
+    if len(frames) == 1:
+        return out
+    for delta in frames[1:]:
+        rows = out.index.append(delta.index.difference(out.index, sort=False))
+        cols = out.columns.append(delta.columns.difference(out.columns, sort=False))
+        out = delta.combine_first(out).reindex(index=rows, columns=cols)
+    return out.sort_index(axis=1) if kind == "ratios" else out.sort_index()
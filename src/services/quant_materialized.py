@@ -0,0 +1,190 @@
+"""
+Materialized per-company quant views in Redis.
+
+For every company x timeframe, MaterializedViews precomputes the exact payloads the
+ratios, performance and risk_matrix tasks return (records format) and stores them as
+one Redis hash of zlib-compressed JSON fields:
+
+    quant:views:{timeframe}:{company}
+        versions             {"ratios": <version>, "metrics": <version>, "universe": <version>}
+        ratios               full ratios payload (every metric)
+        performance:{label}  performance payload for period label '2024Q1'
+        risk_matrix:{label}  risk matrix payload for period label '2024Q1' (peers: every
+                             company in the period)
+
+Each entry records the dataset versions it was built from. refresh() only rebuilds
+companies whose source versions changed (with the partitioned layout that is just the
+companies whose partitions were rewritten, except that a change to any ratios partition
+shifts the peer-relative risk scores of every company), and lookups ignore entries whose versions
+no longer match the data, so a stale payload is never served.
+"""
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+import redis
+
+from src.core.logger import configure_logging
+from src.services.period_catalog import period_label
+from src.services.quant_reader import QuantDataReader
+from src.services.quant_views import performance_payload, ratios_payload, risk_payloads
+from src.services.risk_matrix import PeerDistribution, SketchDistribution
+
+logger = configure_logging()
+
+QUANT_VIEWS_REDIS_URL = os.getenv("QUANT_VIEWS_REDIS_URL", "redis://localhost:6379/1")
+QUANT_VIEWS_REFRESH_SECONDS = float(os.getenv("QUANT_VIEWS_REFRESH_SECONDS", 300))
+
+KEY_PREFIX = "quant:views"
+VERSION_FIELD = "versions"
+# dataset each materialized view is derived from; risk scores are ranked against every
+# company of the period, so they depend on the whole ratios dataset ("universe")
+VIEW_SOURCES = {"ratios": "ratios", "performance": "metrics", "risk_matrix": "universe"}
+
+
+def _encode(payload: Any) -> bytes:
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _select_ratio_rows(records: List[Dict[str, Any]], variables: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Rows of the full ratios payload in `variables` order, with all-None rows for
+    metrics the company does not have (same result as reindexing the frame).
+    """
+    name_col, *value_cols = records[0].keys()
+    by_metric = {row[name_col]: row for row in records}
+    return [by_metric.get(var, {name_col: var, **{c: None for c in value_cols}}) for var in variables]
+
+
+class MaterializedViews:
+    """Builds, refreshes and looks up the materialized payloads of one QuantDataReader."""
+
+    def __init__(self, reader: QuantDataReader, client: Optional[redis.Redis] = None, url: str = QUANT_VIEWS_REDIS_URL):
+        self.reader = reader
+        self.client = client if client is not None else redis.Redis.from_url(url)
+
+    @staticmethod
+    def key(company: str, timeframe: str) -> str:
+        return f"{KEY_PREFIX}:{timeframe}:{company}"
+
+    def _version(self, kind: str, company: str, timeframe: str) -> str:
+        if kind == "universe":
+            return self.reader.universe_version(timeframe)
+        return self.reader.dataset_version(kind, company, timeframe)
+
+    def _versions(self, company: str, timeframe: str, universe: Optional[str] = None) -> Dict[str, str]:
+        """
+        Source versions of a company's entry. `universe` is the whole-dataset version when
+        the caller already has it: with the partitioned layout it revalidates every
+        company partition, so refresh computes it once per pass.
+        """
+        return {
+            "ratios": self._version("ratios", company, timeframe),
+            "metrics": self._version("metrics", company, timeframe),
+            "universe": universe if universe is not None else self._version("universe", company, timeframe),
+        }
+
+    # ---------------- build ----------------
+    def build(
+        self,
+        company: str,
+        timeframe: str,
+        versions: Optional[Dict[str, str]] = None,
+        peers: Optional[Mapping[str, Union[PeerDistribution, SketchDistribution]]] = None,
+    ) -> Dict[str, bytes]:
+        """
+        Every materialized field of one company, encoded and ready for HSET. `versions`
+        and the period `peers` are computed when not given (refresh shares them between
+        companies).
+        """
+        if versions is None:
+            versions = self._versions(company, timeframe)
+        if peers is None:
+            peers = self.reader.peer_distributions(timeframe)
+        fields = {VERSION_FIELD: _encode(versions)}
+
+        ratios = self.reader.company_ratios(company, timeframe)
+        fields["ratios"] = _encode(ratios_payload(ratios, company, []))
+        # every period of the company scored in one batch call against its cross-section
+        labels = self.reader.period_catalog("ratios", company, timeframe).labels
+        risk = risk_payloads(ratios, company, labels, peers)
+        for label, payload in zip(labels, risk):
+            fields.setdefault(f"risk_matrix:{label}", _encode(payload))
+
+        metrics = self.reader.company_metrics(company, timeframe)
+        for pos, label in enumerate(self.reader.period_catalog("metrics", company, timeframe).labels):
+            fields.setdefault(f"performance:{label}", _encode(performance_payload(metrics, company, [pos])))
+        return fields
+
+    def refresh(self, timeframe: str, companies: Optional[Iterable[str]] = None, force: bool = False) -> Dict[str, int]:
+        """Rebuild the entries whose source datasets changed; returns counts of rebuilt, unchanged and failed companies."""
+        counts = {"rebuilt": 0, "unchanged": 0, "failed": 0}
+        # whole-dataset inputs are resolved once per pass, not once per company
+        universe = self.reader.universe_version(timeframe)
+        peers = None
+        for company in companies if companies is not None else self.reader.companies(timeframe):
+            key = self.key(company, timeframe)
+            try:
+                versions = self._versions(company, timeframe, universe)
+                stored = self.client.hget(key, VERSION_FIELD)
+                if not force and stored is not None and _decode(stored) == versions:
+                    counts["unchanged"] += 1
+                    continue
+                if peers is None:
+                    peers = self.reader.peer_distributions(timeframe)
+                fields = self.build(company, timeframe, versions, peers)
+                pipe = self.client.pipeline(transaction=True)
+                pipe.delete(key)
+                pipe.hset(key, mapping=fields)
+                pipe.execute()
+                counts["rebuilt"] += 1
+            except Exception:
+                logger.exception("Failed to materialize quant views for %s (%s)", company, timeframe)
+                counts["failed"] += 1
+        return counts
+
+    def run_forever(self, timeframes: Sequence[str], interval: float = QUANT_VIEWS_REFRESH_SECONDS) -> None:
+        logger.info("Refreshing materialized quant views for %s every %.0fs", list(timeframes), interval)
+        while True:
+            for timeframe in timeframes:
+                try:
+                    counts = self.refresh(timeframe)
+                    if counts["rebuilt"] or counts["failed"]:
+                        logger.info("Materialized views (%s): %s", timeframe, counts)
+                except Exception:
+                    logger.exception("Materialized view refresh failed (%s)", timeframe)
+            time.sleep(interval)
+
+    # ---------------- lookup ----------------
+    def _lookup(self, view: str, company: str, timeframe: str, field: str) -> Optional[Any]:
+        """Stored payload of `field`, or None when it is missing or built from older data."""
+        try:
+            stored_versions, blob = self.client.hmget(self.key(company, timeframe), [VERSION_FIELD, field])
+            if stored_versions is None or blob is None:
+                return None
+            kind = VIEW_SOURCES[view]
+            if _decode(stored_versions).get(kind) != self._version(kind, company, timeframe):
+                return None
+            return _decode(blob)
+        except Exception as e:
+            print("MATERIALIZED VIEW ERROR:", repr(e))
+            return None
+
+    def ratios(self, company: str, timeframe: str, variables: Sequence[str]) -> Optional[List[Dict[str, Any]]]:
+        records = self._lookup("ratios", company, timeframe, "ratios")
+        if not records or not variables:
+            # an empty payload cannot be filtered by metric; let the view handle it
+            return records if not variables else None
+        return _select_ratio_rows(records, variables)
+
+    def performance(self, company: str, period: str, timeframe: str) -> Optional[Any]:
+        return self._lookup("performance", company, timeframe, f"performance:{period_label(period)}")
+
+    def risk_matrix(self, company: str, period: str, timeframe: str) -> Optional[Dict[str, Any]]:
+        return self._lookup("risk_matrix", company, timeframe, f"risk_matrix:{period_label(period)}")
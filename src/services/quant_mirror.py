@@ -0,0 +1,143 @@
+"""
+Local Arrow IPC mirror of the quant datasets in Azure Blob Storage.
+
+QuantMirror copies every parquet file under the quant dataset roots to an uncompressed
+Arrow IPC (Feather v2) file with the same relative path, e.g.
+
+    az://data/ratios/quarterly/all_ratios.parquet -> {mirror}/ratios/quarterly/all_ratios.arrow
+
+A file is only re-downloaded when the blob's ETag changes. Readers open the mirrored
+files through a memory map and keep the mapped tables, so every process on the node
+(API and Celery workers) shares the same page-cached bytes; only the slices a request
+reads, and the cubes derived from them, are decoded into each process's heap.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import fsspec
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.core.logger import configure_logging
+from src.services.dataset_cache import blob_version
+
+logger = configure_logging()
+
+QUANT_MIRROR_DIR = os.getenv("QUANT_MIRROR_DIR", "")
+QUANT_MIRROR_INTERVAL_SECONDS = float(os.getenv("QUANT_MIRROR_INTERVAL_SECONDS", 60))
+
+MIRROR_ROOTS = ("stocks", "ratios", "metrics", "partitioned")
+MIRROR_SUFFIX = ".arrow"
+MANIFEST_NAME = "manifest.json"
+
+
+def mirror_path(remote_path: str, base: str, local_root: str) -> Optional[str]:
+    """Local mirror location of a remote file or partition directory under `base`."""
+    if not local_root or not remote_path.startswith(base.rstrip("/") + "/"):
+        return None
+    relative = remote_path[len(base.rstrip("/")) + 1:]
+    if relative.endswith(".parquet"):
+        relative = relative[: -len(".parquet")] + MIRROR_SUFFIX
+    return str(Path(local_root) / relative)
+
+
+class QuantMirror:
+    """
+    Keeps `local_root` in sync with the quant parquet files under `base`.
+
+    sync() is idempotent and cheap when nothing changed: it lists the remote roots,
+    compares ETags with the local manifest and only converts changed blobs. Files are
+    written to a temporary name and renamed, so readers never see a partial file.
+    """
+
+    def __init__(self, base: str, local_root: str, storage_options: Optional[Dict[str, Any]] = None):
+        if not local_root:
+            raise ValueError("QuantMirror requires a local mirror directory")
+        self.base = base.rstrip("/")
+        self.local_root = Path(local_root)
+        self.storage_options = storage_options or {}
+        self.manifest_path = self.local_root / MANIFEST_NAME
+
+    def _load_manifest(self) -> Dict[str, str]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except Exception:
+            logger.exception("Unreadable mirror manifest %s; resyncing everything", self.manifest_path)
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, str]) -> None:
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def _remote_files(self, fs, fs_base: str) -> Dict[str, Dict[str, Any]]:
+        """relative path -> blob info for every parquet file under the mirrored roots."""
+        files = {}
+        for root in MIRROR_ROOTS:
+            fs_root = f"{fs_base}/{root}"
+            if not fs.exists(fs_root):
+                continue
+            for name, info in fs.find(fs_root, detail=True).items():
+                if name.endswith(".parquet"):
+                    files[name[len(fs_base) + 1:]] = info
+        return files
+
+    def _convert(self, fs, fs_file: str, local_file: Path) -> None:
+        with fs.open(fs_file, "rb") as fh:
+            table = pq.read_table(fh)
+        local_file.parent.mkdir(parents=True, exist_ok=True)
+        # dot-prefixed so dataset discovery in a partition directory skips it mid-write
+        tmp = local_file.with_name(f".{local_file.name}.tmp")
+        # uncompressed IPC so readers can map buffers straight from the page cache
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, local_file)
+
+    def sync(self) -> Dict[str, int]:
+        """Bring the mirror up to date; returns counts of updated, removed and unchanged files."""
+        fs, fs_base = fsspec.core.url_to_fs(self.base, **self.storage_options)
+        fs.invalidate_cache()
+        self.local_root.mkdir(parents=True, exist_ok=True)
+
+        manifest = self._load_manifest()
+        remote = self._remote_files(fs, fs_base)
+        counts = {"updated": 0, "removed": 0, "unchanged": 0}
+
+        for relative, info in remote.items():
+            version = blob_version(info)
+            local_file = Path(mirror_path(f"{self.base}/{relative}", self.base, str(self.local_root)))
+            if manifest.get(relative) == version and local_file.exists():
+                counts["unchanged"] += 1
+                continue
+            try:
+                self._convert(fs, f"{fs_base}/{relative}", local_file)
+                manifest[relative] = version
+                counts["updated"] += 1
+                logger.info("Mirrored %s (%s)", relative, version)
+            except Exception:
+                logger.exception("Failed to mirror %s", relative)
+
+        for relative in [r for r in manifest if r not in remote]:
+            local_file = Path(mirror_path(f"{self.base}/{relative}", self.base, str(self.local_root)))
+            local_file.unlink(missing_ok=True)
+            manifest.pop(relative)
+            counts["removed"] += 1
+
+        self._save_manifest(manifest)
+        return counts
+
+    def run_forever(self, interval: float = QUANT_MIRROR_INTERVAL_SECONDS) -> None:
+        logger.info("Mirroring %s to %s every %.0fs", self.base, self.local_root, interval)
+        while True:
+            try:
+                counts = self.sync()
+                if counts["updated"] or counts["removed"]:
+                    logger.info("Mirror sync: %s", counts)
+            except Exception:
+                logger.exception("Mirror sync failed")
+            time.sleep(interval)
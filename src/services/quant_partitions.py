@@ -0,0 +1,127 @@
+"""
+Company-partitioned layout of the quant datasets.
+
+Each dataset is stored as a hive-partitioned tree
+
+    {base}/partitioned/{kind}/timeframe={timeframe}/company={company}/part-0.parquet
+
+where every file holds one company's history as rows sorted by a `period` column
+(one column per variable / metric). Row groups are small and carry min/max statistics,
+so period predicates prune row groups, and a request only ever lists and reads its own
+company directory regardless of how many companies the dataset holds.
+
+The split_* helpers turn the monolithic frames into per-company partition frames and
+the *_from_partition helpers rebuild the shapes the monolithic readers return.
+"""
+from typing import Iterator, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARTITION_ROOT = "partitioned"
+PERIOD_COLUMN = "period"
+DEFAULT_ROW_GROUP_SIZE = 8
+
+
+def dataset_root(kind: str, base: str) -> str:
+    return f"{base}/{PARTITION_ROOT}/{kind}"
+
+
+def partition_dir(kind: str, timeframe: str, company: str, base: str) -> str:
+    return f"{dataset_root(kind, base)}/timeframe={timeframe}/company={company}"
+
+
+# ---------------- monolithic -> partitions ----------------
+def split_stocks(df: pd.DataFrame) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """stocks frame (date x (variable, company)) -> (company, date rows x variables)."""
+    dates = df.index.to_timestamp() if isinstance(df.index, pd.PeriodIndex) else pd.DatetimeIndex(df.index)
+    for company in df.columns.get_level_values(1).unique():
+        part = df.xs(company, level=1, axis=1).copy()
+        part.index = dates
+        yield str(company), _with_period_column(part)
+
+
+def split_ratios(df: pd.DataFrame, freq: Optional[str] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    ratios frame ((company, metric) x dates) -> (company, period rows x metrics).
+    `freq` is needed when it cannot be inferred from the dates (e.g. a single new quarter).
+    """
+    labels = pd.DatetimeIndex(df.columns).to_period(freq).astype(str)
+    for company in df.index.get_level_values(0).unique():
+        part = df.xs(company, level=0).T
+        part.index = labels
+        yield str(company), _with_period_column(part)
+
+
+def split_metrics(df: pd.DataFrame) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """metrics frame (period x (metric, company)) -> (company, period rows x metrics)."""
+    labels = df.index.astype(str)
+    for company in df.columns.get_level_values(1).unique():
+        part = df.xs(company, level=1, axis=1).copy()
+        part.index = labels
+        yield str(company), _with_period_column(part)
+
+
+def _with_period_column(part: pd.DataFrame) -> pd.DataFrame:
+    part = part.sort_index()
+    part.columns = [str(c) for c in part.columns]
+    part.index.name = PERIOD_COLUMN
+    return part.reset_index()
+
+
+def drop_empty_periods(part: pd.DataFrame) -> pd.DataFrame:
+    """Rows of a partition frame that hold at least one value (a delta must not blank out periods)."""
+    values = part.drop(columns=[PERIOD_COLUMN])
+    return part[values.notna().any(axis=1)].reset_index(drop=True)
+
+
+def merge_partition_rows(part: pd.DataFrame) -> pd.DataFrame:
+    """
+    Overlay the rows of a partition and its delta fragments (read in publish order) per
+    period, cell by cell: a later fragment's non-null cells win and the cells it leaves
+    empty keep their earlier values, like merge_fragments does for monolithic files.
+    """
+    if not part[PERIOD_COLUMN].duplicated().any():
+        return part
+    # GroupBy.last takes the last non-null value of each column
+    return part.groupby(PERIOD_COLUMN, sort=True).last().reset_index()
+
+
+def write_partition(part: pd.DataFrame, path: str, fs, row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> None:
+    """Write one company partition sorted by period with per-row-group statistics."""
+    table = pa.Table.from_pandas(part.sort_values(PERIOD_COLUMN), preserve_index=False)
+    with fs.open(path, "wb") as fh:
+        pq.write_table(
+            table,
+            fh,
+            row_group_size=row_group_size,
+            write_statistics=True,
+            sorting_columns=[pq.SortingColumn(0)],
+        )
+
+
+# ---------------- partitions -> reader shapes ----------------
+def stocks_from_partition(part: pd.DataFrame, company: str) -> pd.DataFrame:
+    """Inverse of split_stocks for one company: DatetimeIndex x (variable, company)."""
+    out = part.set_index(PERIOD_COLUMN).sort_index()
+    out.index = pd.DatetimeIndex(out.index)
+    out.columns = pd.MultiIndex.from_tuples([(c, company) for c in out.columns])
+    return out
+
+
+def ratios_from_partition(part: pd.DataFrame, company: str) -> pd.DataFrame:
+    """Inverse of split_ratios for one company: (company, metric) x period labels."""
+    out = part.set_index(PERIOD_COLUMN).sort_index().T
+    out.columns = out.columns.astype(str)
+    out.columns.name = None
+    out.index = pd.MultiIndex.from_tuples([(company, m) for m in out.index])
+    return out
+
+
+def metrics_from_partition(part: pd.DataFrame, company: str) -> pd.DataFrame:
+    """Inverse of split_metrics for one company: period labels x (metric, company)."""
+    out = part.set_index(PERIOD_COLUMN).sort_index()
+    out.index.name = None
+    out.columns = pd.MultiIndex.from_tuples([(c, company) for c in out.columns])
+    return out
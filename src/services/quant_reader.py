@@ -0,0 +1,818 @@
+"""
+Slice readers for the quant parquet datasets (stocks, ratios, metrics).
+
+The datasets are written by pandas, so MultiIndex columns are stored as flattened
+names such as "('Close', 'AAPL')" and index levels as regular columns described in
+the pandas metadata. The reader uses that metadata to ask pyarrow for only the
+columns a request needs, and pushes company/period predicates down as row filters,
+so most of each file is never fetched or decoded.
+"""
+import copy
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from src.core.constants import RATIO_GROUPS
+from src.core.logger import configure_logging
+from src.services.chart_downsampling import PYRAMID_LEVELS, resample_level
+from src.services.dataset_cache import CacheMiss, DatasetCache
+from src.services.market_analytics import PERIODS_PER_YEAR, compute_analytics
+from src.services.quant_deltas import delta_dir, list_fragments, merge_fragments
+from src.services.quant_mirror import MIRROR_SUFFIX, QUANT_MIRROR_DIR, mirror_path
+from src.services.quant_partitions import (
+    PERIOD_COLUMN,
+    dataset_root,
+    merge_partition_rows,
+    metrics_from_partition,
+    partition_dir,
+    ratios_from_partition,
+    stocks_from_partition,
+)
+from src.services.period_catalog import PeriodCatalog
+from src.services.ratio_cube import RatioCube
+from src.services.risk_cube import RiskCube
+from src.services.risk_matrix import PeerDistribution, SketchDistribution, calculate_category_scores_batch
+
+logger = configure_logging()
+
+AZURE_BASE = "az://data"
+# 'monolithic' reads the all_*.parquet files, 'partitioned' the per-company tree
+# written by src/scripts/partition_quant_data.py
+QUANT_DATA_LAYOUT = os.getenv("QUANT_DATA_LAYOUT", "monolithic")
+# > 0: keep the per-period peer universes as KLL sketches of this size (bounded memory
+# per metric, approximate ranks past k peers) instead of the full sorted peer arrays
+RISK_PEER_SKETCH_K = int(os.getenv("RISK_PEER_SKETCH_K", "0"))
+# companies decoded at a time while building the sketch peer universes
+RISK_PEER_CHUNK_COMPANIES = int(os.getenv("RISK_PEER_CHUNK_COMPANIES", "500"))
+
+# schema -> (physical columns to read or None for all, row filter or None)
+ReadPlan = Callable[[pa.Schema], Tuple[Optional[List[str]], Optional[ds.Expression]]]
+
+
+def stocks_path(timeframe: str, base: str = AZURE_BASE) -> str:
+    return f"{base}/stocks/{timeframe}/{timeframe}.parquet"
+
+
+def ratios_path(timeframe: str, base: str = AZURE_BASE) -> str:
+    return f"{base}/ratios/{timeframe}/all_ratios.parquet"
+
+
+def metrics_path(timeframe: str, base: str = AZURE_BASE) -> str:
+    return f"{base}/metrics/{timeframe}/all_metrics.parquet"
+
+
+MONOLITHIC_PATHS: Dict[str, Callable[[str, str], str]] = {
+    "stocks": stocks_path,
+    "ratios": ratios_path,
+    "metrics": metrics_path,
+}
+
+# period frequency of each timeframe, for date columns too few to infer it from
+TIMEFRAME_FREQ = {"quarterly": "Q", "yearly": "Y"}
+
+
+def _dates_freq(dates: Sequence[Any], timeframe: str) -> Any:
+    """Period frequency of the ratio date columns, inferred when there are enough of them."""
+    try:
+        return pd.DatetimeIndex(dates).to_period().freq
+    except (ValueError, AttributeError):
+        # too few dates to infer from, e.g. a delta fragment holding a single new quarter
+        return TIMEFRAME_FREQ.get(timeframe, "Q")
+
+
+# ---------------- pandas metadata helpers ----------------
+def _pandas_columns(schema: pa.Schema) -> Dict[str, Dict[str, Any]]:
+    """field_name -> pandas metadata entry for every stored column."""
+    meta = schema.pandas_metadata or {}
+    return {c["field_name"]: c for c in meta.get("columns", []) if c.get("field_name")}
+
+
+def _index_columns(schema: pa.Schema) -> List[str]:
+    """Names of the physical columns that hold the pandas index levels."""
+    meta = schema.pandas_metadata or {}
+    return [c for c in meta.get("index_columns", []) if isinstance(c, str)]
+
+
+def _period_freq(column_meta: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Frequency of a period-typed column, e.g. 'period[Q-DEC]' -> 'Q-DEC'."""
+    numpy_type = (column_meta or {}).get("numpy_type") or ""
+    if numpy_type.startswith("period[") and numpy_type.endswith("]"):
+        return numpy_type[len("period["):-1]
+    return None
+
+
+def _restore_period_index(df: pd.DataFrame, schema: pa.Schema) -> pd.DataFrame:
+    """
+    Column-projected reads lose the pandas period extension type and come back as
+    integer ordinals; rebuild the PeriodIndex from the stored frequency.
+    """
+    index_cols = _index_columns(schema)
+    if len(index_cols) != 1 or isinstance(df.index, pd.PeriodIndex):
+        return df
+    freq = _period_freq(_pandas_columns(schema).get(index_cols[0]))
+    if freq and pd.api.types.is_integer_dtype(df.index.dtype):
+        df.index = pd.PeriodIndex.from_ordinals(df.index.to_numpy(), freq=freq).rename(df.index.name)
+    return df
+
+
+def _storage_table(table: pa.Table) -> pa.Table:
+    """Replace extension-typed columns (e.g. pandas periods) by their storage arrays."""
+    columns = [
+        pa.chunked_array([chunk.storage for chunk in col.chunks], type=col.type.storage_type)
+        if isinstance(col.type, pa.BaseExtensionType) else col
+        for col in table.columns
+    ]
+    return pa.Table.from_arrays(columns, names=table.column_names, metadata=table.schema.metadata)
+
+
+def _index_scalar(schema: pa.Schema, field_name: str, value: str) -> Optional[Any]:
+    """
+    Translate a period label ('2024Q1') into the physical value stored in an index
+    column, or None when the column type does not allow a safe pushdown.
+    """
+    field_type = schema.field(field_name).type
+    if isinstance(field_type, pa.BaseExtensionType):
+        field_type = field_type.storage_type
+    freq = _period_freq(_pandas_columns(schema).get(field_name))
+    try:
+        if freq and pa.types.is_integer(field_type):
+            return pd.Period(value, freq=freq).ordinal
+        if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+            return value
+    except (ValueError, TypeError):
+        return None
+    return None
+
+
+def _row_fingerprints(values: np.ndarray) -> np.ndarray:
+    """64-bit fingerprint of each row's values (odd multipliers, so any single change shows)."""
+    bits = np.ascontiguousarray(values, dtype=float).view(np.uint64)
+    weights = np.random.default_rng(0).integers(0, 2**63, size=bits.shape[1], dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    return (bits * weights).sum(axis=1, dtype=np.uint64)
+
+
+def _cell_fingerprints(cube: RatioCube) -> np.ndarray:
+    """(companies, periods) fingerprints of every cell's metric values."""
+    n_companies, n_metrics, n_periods = cube.values.shape
+    flat = cube.values.transpose(0, 2, 1).reshape(n_companies * n_periods, n_metrics)
+    return _row_fingerprints(flat).reshape(n_companies, n_periods)
+
+
+def _keyed_fingerprints(cube: RatioCube) -> np.ndarray:
+    """
+    (companies, periods) fingerprints of every cell keyed by metric name rather than
+    position, so cubes over different metric sets (chunks of companies) agree: a metric
+    the cube lacks reads as missing, and a value of 0.0 still differs from missing.
+    """
+    weights = np.array([int.from_bytes(hashlib.sha1(str(m).encode("utf-8")).digest()[:8], "little") | 1 for m in cube.metrics], dtype=np.uint64)
+    values = np.ascontiguousarray(cube.values, dtype=float)
+    bits = np.where(np.isnan(values), np.uint64(0), values.view(np.uint64) + np.uint64(1))
+    return (bits * weights[None, :, None]).sum(axis=1, dtype=np.uint64)
+
+
+@dataclass(frozen=True)
+class _PeriodPeers:
+    # metric order of the fingerprints (None: keyed by metric name, see _keyed_fingerprints)
+    metrics: Optional[List[str]]
+    # companies with at least one value in the period and the fingerprints of their rows
+    companies: pd.Index
+    fingerprints: np.ndarray
+    dist: Union[PeerDistribution, SketchDistribution]
+
+
+@dataclass(frozen=True)
+class _RiskState:
+    # ratio cube axes and cell fingerprints the risk cube was scored from
+    companies: pd.Index
+    metrics: pd.Index
+    periods: pd.Index
+    fingerprints: np.ndarray
+    risk: RiskCube
+
+    def changed_cells(self, cube: RatioCube, fingerprints: np.ndarray) -> List[Tuple[str, str]]:
+        """(company, period) cells whose values differ in `cube`, including cells added or removed."""
+        empty = _row_fingerprints(np.full((1, len(cube.metrics)), np.nan))[0]
+        before = pd.DataFrame(self.fingerprints, index=self.companies, columns=self.periods)
+        after = pd.DataFrame(fingerprints, index=cube.companies, columns=cube.periods)
+        companies, periods = before.index.union(after.index), before.columns.union(after.columns)
+        before = before.reindex(index=companies, columns=periods, fill_value=empty).to_numpy()
+        after = after.reindex(index=companies, columns=periods, fill_value=empty).to_numpy()
+        rows, cols = np.nonzero(before != after)
+        return list(zip(companies[rows], periods[cols]))
+
+
+class QuantDataReader:
+    """
+    Reads company/period slices of the quant datasets through a DatasetCache.
+
+    Each slice is cached under its own variant of the blob path, so repeated requests
+    for the same company reuse the decoded slice and any blob update invalidates it.
+    With layout='partitioned' only the requested company's partition directory is
+    listed and read, and period predicates prune row groups inside it.
+
+    When `mirror_dir` holds a local Arrow mirror (see QuantMirror), files present in
+    the mirror are memory-mapped from disk and Azure is not contacted at all.
+    """
+
+    def __init__(
+        self,
+        cache: DatasetCache,
+        storage_options: Optional[Dict[str, Any]] = None,
+        base: str = AZURE_BASE,
+        layout: str = QUANT_DATA_LAYOUT,
+        mirror_dir: str = QUANT_MIRROR_DIR,
+        peer_sketch_k: int = RISK_PEER_SKETCH_K,
+    ):
+        if layout not in ("monolithic", "partitioned"):
+            raise ValueError("layout must be 'monolithic'|'partitioned'")
+        self.cache = cache
+        self.storage_options = storage_options or {}
+        self.base = base
+        self.layout = layout
+        self.mirror_dir = mirror_dir
+        self.peer_sketch_k = peer_sketch_k
+        # last built peer universes and risk cube per timeframe, updated in place of a
+        # full rebuild by the next dataset version (see _period_peers and risk_cube)
+        self._peer_state: Dict[str, Dict[str, _PeriodPeers]] = {}
+        self._risk_state: Dict[str, _RiskState] = {}
+        self._local_fs = pafs.LocalFileSystem(use_mmap=True)
+        self._cached_only = False
+
+    def warm_only(self) -> "QuantDataReader":
+        """
+        A reader sharing this cache that never performs I/O: every slice must already be
+        cached and fresh, otherwise CacheMiss is raised.
+        """
+        reader = copy.copy(self)
+        reader._cached_only = True
+        return reader
+
+    # ---------------- low level ----------------
+    def _resolve(self, path: str) -> str:
+        """Mirror location of `path` when it has been mirrored locally, else `path` itself."""
+        local = mirror_path(path, self.base, self.mirror_dir)
+        if local is not None and os.path.exists(local):
+            return local
+        return path
+
+    def _mapped(self, path: str) -> pa.Table:
+        """
+        Whole mirrored file as a table whose buffers point into the memory map. It is
+        cached as is, so the bytes stay in the page cache shared by every worker process
+        on the node and only the slices read from it are copied into the process heap.
+        """
+        load = lambda p: ds.dataset(p, filesystem=self._local_fs, format="ipc").to_table()
+        return self.cache.get(path, load, variant=("mapped",))
+
+    def _dataset(self, path: str) -> ds.Dataset:
+        if self.mirror_dir and path.startswith(self.mirror_dir):
+            is_dir = os.path.isdir(path)
+            if is_dir or path.endswith(MIRROR_SUFFIX):
+                return ds.InMemoryDataset(self._mapped(path))
+        fs, fs_path = fsspec.core.url_to_fs(path, **self.storage_options)
+        return ds.dataset(fs_path, filesystem=fs, format="parquet")
+
+    def _read(self, path: str, plan: Optional[ReadPlan] = None) -> pd.DataFrame:
+        """
+        Read a slice of `path`. `plan(schema)` returns the physical columns to keep
+        (None for all; index columns are always added) and an optional row filter.
+        """
+        try:
+            dataset = self._dataset(path)
+            schema = dataset.schema
+            columns, row_filter = plan(schema) if plan is not None else (None, None)
+            if columns is not None:
+                index_cols = [c for c in _index_columns(schema) if c not in columns]
+                columns = index_cols + [c for c in columns if c in schema.names]
+            if row_filter is not None and any(isinstance(t, pa.BaseExtensionType) for t in schema.types):
+                # once pandas has registered its extension types, arrow has no comparison
+                # kernels for them; decode the projected columns and filter on storage values
+                table = _storage_table(dataset.to_table(columns=columns)).filter(row_filter)
+            else:
+                table = dataset.to_table(columns=columns, filter=row_filter)
+            return _restore_period_index(table.to_pandas(), schema)
+        except Exception as e:
+            print(f"AZURE ERROR: {e}")
+            raise
+
+    def _cached(
+        self, path: str, variant: Hashable, plan: Optional[ReadPlan] = None, kind: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Cached read of `path`. With `kind`, a monolithic base file is merged with its delta
+        fragments (see quant_deltas).
+        """
+        # the plan only runs on a cache miss, so warm reads never touch the parquet footer
+        load = lambda p: self._read(p, plan)
+        if kind is not None:
+            return self._merged(kind, path, variant, load)
+        return self.cache.get(self._resolve(path), load, variant=variant, cached_only=self._cached_only)
+
+    # ---------------- delta fragments ----------------
+    def _delta_token(self, path: str) -> str:
+        """Version of the delta directory of monolithic base file `path` ("" when there is none)."""
+        return self.cache.version(self._resolve(delta_dir(path)), cached_only=self._cached_only)
+
+    def _fragments(self, path: str) -> Tuple[str, ...]:
+        """Delta fragment paths of monolithic base file `path`, in publish order."""
+        if not self._delta_token(path):
+            return ()
+        root = self._resolve(delta_dir(path))
+
+        def listing(p: str) -> Tuple[str, ...]:
+            fs, fs_dir = fsspec.core.url_to_fs(p, **self.storage_options)
+            names = list_fragments(fs, fs_dir)
+            return tuple(fs.unstrip_protocol(n) if "://" in p else n for n in names)
+
+        return self.cache.get(root, listing, variant=("fragments",), cached_only=self._cached_only)
+
+    def _merged(self, kind: str, path: str, variant: Hashable, load: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
+        """
+        `load` applied to the base file and to each delta fragment, merged. Every piece is
+        cached under its own path, so a new fragment only costs reading that fragment.
+        """
+        base = self.cache.get(self._resolve(path), load, variant=variant, cached_only=self._cached_only)
+        fragments = self._fragments(path)
+        if not fragments:
+            return base
+        parts = [base] + [self.cache.get(f, load, variant=variant, cached_only=self._cached_only) for f in fragments]
+        return self.cache.get(
+            self._resolve(path),
+            lambda p: merge_fragments(kind, parts),
+            variant=("merged", variant, self._delta_token(path)),
+            cached_only=self._cached_only,
+        )
+
+    def _derived_variant(self, kind: str, timeframe: str, variant: Hashable) -> Hashable:
+        """Cache variant for frames derived from a whole dataset; also keyed by its delta fragments."""
+        if self.layout == "partitioned":
+            return variant
+        return (variant, self._delta_token(MONOLITHIC_PATHS[kind](timeframe, self.base)))
+
+    def _partition(
+        self,
+        kind: str,
+        timeframe: str,
+        company: str,
+        variant: Hashable,
+        columns: Optional[Sequence[str]] = None,
+        row_filter: Optional[ds.Expression] = None,
+    ) -> pd.DataFrame:
+        """Read one company partition; returns period rows (possibly empty) x requested columns."""
+        path = partition_dir(kind, timeframe, company, self.base)
+
+        def plan(schema: pa.Schema):
+            keep = None if columns is None else [PERIOD_COLUMN] + [c for c in columns if c != PERIOD_COLUMN]
+            return keep, row_filter
+
+        def load(p: str) -> pd.DataFrame:
+            # files are read in name order, so a delta fragment (part-{stamp}) restating a
+            # period comes after part-0 and its values win
+            return merge_partition_rows(self._read(p, plan))
+
+        return self.cache.get(self._resolve(path), load, variant=(kind, company, variant), cached_only=self._cached_only)
+
+    # ---------------- sources and versions ----------------
+    def source(self, kind: str, company: str, timeframe: str) -> str:
+        """File (monolithic) or partition directory (partitioned) holding a company's `kind` data."""
+        if self.layout == "partitioned":
+            return self._resolve(partition_dir(kind, timeframe, company, self.base))
+        return self._resolve(MONOLITHIC_PATHS[kind](timeframe, self.base))
+
+    def dataset_version(self, kind: str, company: str, timeframe: str) -> str:
+        """Version token of the data behind a company's `kind` slices; changes whenever they may change."""
+        version = self.cache.version(self.source(kind, company, timeframe), cached_only=self._cached_only)
+        if self.layout == "monolithic":
+            deltas = self._delta_token(MONOLITHIC_PATHS[kind](timeframe, self.base))
+            if deltas:
+                version = f"{version}+{deltas}"
+        return version
+
+    def companies(self, timeframe: str, kind: str = "ratios") -> List[str]:
+        """Companies present in the `kind` dataset ('ratios' or 'stocks') of `timeframe`."""
+        if self.layout == "partitioned":
+            root = self._resolve(f"{dataset_root(kind, self.base)}/timeframe={timeframe}")
+            fs, fs_root = fsspec.core.url_to_fs(root, **self.storage_options)
+            fs.invalidate_cache(fs_root)
+            names = [name.rstrip("/").rsplit("/", 1)[-1] for name in fs.ls(fs_root, detail=False)]
+            return sorted(name[len("company="):] for name in names if name.startswith("company="))
+
+        if kind == "stocks":
+            return sorted(self.price_panel(timeframe).columns.astype(str))
+
+        def plan(schema: pa.Schema):
+            # index columns only
+            return [], None
+
+        df = self._cached(ratios_path(timeframe, self.base), ("companies",), plan, kind="ratios")
+        return sorted(df.index.get_level_values(0).unique().astype(str))
+
+    # ---------------- dataset slices ----------------
+    def stock_series(self, company: str, variables: Sequence[str], timeframe: str) -> pd.DataFrame:
+        """(variable, company) columns of stocks/{timeframe}; variables missing from the file are skipped."""
+        if self.layout == "partitioned":
+            part = self._partition("stocks", timeframe, company, tuple(variables), columns=list(variables))
+            return stocks_from_partition(part, company)
+
+        wanted = [str((var, company)) for var in variables]
+
+        def plan(schema: pa.Schema):
+            return wanted, None
+
+        return self._cached(stocks_path(timeframe, self.base), ("stocks", company, tuple(variables)), plan, kind="stocks")
+
+
+    def stock_pyramid(self, company: str, variables: Sequence[str], timeframe: str) -> Dict[str, pd.DataFrame]:
+        """
+        Resolution pyramid of a company's chart series: level name -> DatetimeIndex frame
+        with one column per available variable, finest level first. Coarser levels are
+        built once per blob version and cached next to the slice they derive from; levels
+        that would not reduce the row count are omitted.
+        """
+        df = self.stock_series(company, variables, timeframe)
+        selected = [(var, company) for var in variables if (var, company) in df.columns]
+        base = df[selected].copy()
+        base.columns = [col[0] for col in selected]
+        base.index = df.index.to_timestamp() if isinstance(df.index, pd.PeriodIndex) else pd.DatetimeIndex(df.index)
+        base = base.sort_index()
+
+        source = self.source("stocks", company, timeframe)
+        levels = {}
+        for name, rule in PYRAMID_LEVELS:
+            if rule is None:
+                levels[name] = base
+                continue
+            level = self.cache.get(
+                source,
+                lambda p, rule=rule: resample_level(base, rule),
+                variant=self._derived_variant("stocks", timeframe, ("pyramid", company, tuple(variables), name)),
+                cached_only=self._cached_only,
+            )
+            if len(level) < len(list(levels.values())[-1]):
+                levels[name] = level
+        return levels
+
+    def price_panel(self, timeframe: str, variable: str = "Close") -> pd.DataFrame:
+        """`variable` for every company: DatetimeIndex rows x company columns."""
+        if self.layout == "partitioned":
+            if self._cached_only:
+                # the set of partitions is only known after listing the dataset root
+                raise CacheMiss(("price_panel", timeframe, variable))
+            frames = [self.stock_series(c, [variable], timeframe) for c in self.companies(timeframe, "stocks")]
+            df = pd.concat(frames, axis=1) if frames else pd.DataFrame()
+        else:
+            prefix = f"({variable!r}, "
+
+            def plan(schema: pa.Schema):
+                return [c for c in schema.names if c.startswith(prefix)], None
+
+            df = self._cached(stocks_path(timeframe, self.base), ("stocks", "panel", variable), plan, kind="stocks")
+
+        panel = df.xs(variable, level=0, axis=1) if isinstance(df.columns, pd.MultiIndex) and len(df.columns) else df
+        panel = panel.copy()
+        panel.index = df.index.to_timestamp() if isinstance(df.index, pd.PeriodIndex) else pd.DatetimeIndex(df.index)
+        return panel
+
+    def market_analytics(self, timeframe: str, window: int) -> pd.DataFrame:
+        """
+        Rolling analytics of every company's close prices (see market_analytics), computed
+        once per dataset version and window.
+        """
+        if self.layout == "partitioned":
+            if self._cached_only:
+                raise CacheMiss(("market_analytics", timeframe, window))
+            companies = self.companies(timeframe, "stocks")
+            source = self._resolve(f"{dataset_root('stocks', self.base)}/timeframe={timeframe}")
+            variant = ("analytics", window, tuple(self.dataset_version("stocks", c, timeframe) for c in companies))
+        else:
+            source = self.source("stocks", "", timeframe)
+            variant = self._derived_variant("stocks", timeframe, ("analytics", window))
+
+        return self.cache.get(
+            source,
+            lambda p: compute_analytics(self.price_panel(timeframe), window, PERIODS_PER_YEAR.get(timeframe)),
+            variant=variant,
+            cached_only=self._cached_only,
+        )
+
+    def company_ratios(self, company: str, timeframe: str, periods: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Rows of all_ratios for one company, indexed (company, metric), with the date
+        columns relabelled as period strings ('2024Q1').
+
+        `periods` restricts the columns to those labels; None keeps every period.
+        The period frequency is inferred from the full set of date columns in each
+        file, so a single-period slice is labelled the same way as the whole file.
+        """
+        if self.layout == "partitioned":
+            row_filter = ds.field(PERIOD_COLUMN).isin(list(periods)) if periods is not None else None
+            variant = tuple(periods) if periods is not None else None
+            part = self._partition("ratios", timeframe, company, variant, row_filter=row_filter)
+            return ratios_from_partition(part, company)
+
+        freq = {}
+
+        def plan(schema: pa.Schema):
+            index_cols = _index_columns(schema)
+            data_cols = [c for c in schema.names if c not in index_cols]
+            freq["value"] = _dates_freq(data_cols, timeframe)
+            columns = None
+            if periods is not None:
+                labels = pd.DatetimeIndex(data_cols).to_period(freq["value"]).astype(str)
+                columns = [c for c, label in zip(data_cols, labels) if label in set(periods)]
+            row_filter = ds.field(index_cols[0]) == company if index_cols else None
+            return columns, row_filter
+
+        def load(path: str) -> pd.DataFrame:
+            df = self._read(path, plan)
+            df.columns = pd.DatetimeIndex(df.columns).to_period(freq["value"]).astype(str)
+            return df
+
+        variant = ("ratios", company, tuple(periods) if periods is not None else None)
+        return self._merged("ratios", ratios_path(timeframe, self.base), variant, load)
+
+    def company_metrics(self, company: str, timeframe: str, period: Optional[str] = None) -> pd.DataFrame:
+        """(metric, company) columns of all_metrics, optionally restricted to one period row."""
+        if self.layout == "partitioned":
+            row_filter = ds.field(PERIOD_COLUMN) == period if period is not None else None
+            part = self._partition("metrics", timeframe, company, period, row_filter=row_filter)
+            return metrics_from_partition(part, company)
+
+        def plan(schema: pa.Schema):
+            index_cols = _index_columns(schema)
+            columns = [c for c in schema.names if c not in index_cols and c.endswith(f", {company!r})")]
+            row_filter = None
+            if period is not None and len(index_cols) == 1:
+                scalar = _index_scalar(schema, index_cols[0], period)
+                if scalar is not None:
+                    row_filter = ds.field(index_cols[0]) == scalar
+            return columns, row_filter
+
+        return self._cached(metrics_path(timeframe, self.base), ("metrics", company, period), plan, kind="metrics")
+
+    def _universe_key(self, timeframe: str, variant: Hashable) -> Tuple[str, Hashable]:
+        """
+        Cache path and variant of a structure derived from the whole ratios dataset: keyed by
+        the dataset version, or by the set of partition versions with the partitioned layout.
+        """
+        if self.layout == "partitioned":
+            if self._cached_only:
+                # the set of partitions is only known after listing the dataset root
+                raise CacheMiss((variant, timeframe))
+            versions = tuple(self.dataset_version("ratios", c, timeframe) for c in self.companies(timeframe))
+            root = self._resolve(f"{dataset_root('ratios', self.base)}/timeframe={timeframe}")
+            return root, (variant, versions)
+        return self._resolve(ratios_path(timeframe, self.base)), self._derived_variant("ratios", timeframe, (variant,))
+
+    def universe_version(self, timeframe: str) -> str:
+        """Version token of the whole ratios dataset (every company), e.g. for peer-relative results."""
+        if self.layout == "partitioned":
+            _, (_, versions) = self._universe_key(timeframe, "universe")
+            return hashlib.sha1("|".join(versions).encode("utf-8")).hexdigest()
+        return self.dataset_version("ratios", "", timeframe)
+
+    def ratio_cube(self, timeframe: str) -> RatioCube:
+        """
+        Company x metric x period cube of the whole ratios dataset, built once per dataset
+        version (per set of partition versions with the partitioned layout).
+        """
+        path, variant = self._universe_key(timeframe, "ratio_cube")
+        if self.layout == "partitioned":
+
+            def build(_path: str) -> RatioCube:
+                companies = self.companies(timeframe)
+                return RatioCube.from_frame(pd.concat([self.company_ratios(c, timeframe) for c in companies]).sort_index(axis=1))
+        else:
+            base_path = ratios_path(timeframe, self.base)
+
+            def build(_path: str) -> RatioCube:
+                frames = []
+                for fragment in (base_path, *self._fragments(base_path)):
+                    df = self._read(fragment)
+                    df.columns = pd.DatetimeIndex(df.columns).to_period(_dates_freq(df.columns, timeframe)).astype(str)
+                    frames.append(df)
+                return RatioCube.from_frame(merge_fragments("ratios", frames))
+
+        return self.cache.get(path, build, variant=variant, cached_only=self._cached_only)
+
+    def peer_distributions(self, timeframe: str) -> Dict[str, Union[PeerDistribution, SketchDistribution]]:
+        """
+        Cross-sectional peer universe of every ratios period (all companies in that period),
+        keyed by period label, transformed and sorted once per dataset version; periods
+        whose values did not change keep their universe. With peer_sketch_k > 0 each
+        period is a SketchDistribution built chunk by chunk (see _period_sketches),
+        otherwise a PeerDistribution from the ratio cube (see _period_peers).
+        """
+        path, variant = self._universe_key(timeframe, ("peer_distributions", self.peer_sketch_k))
+        if self.peer_sketch_k > 0:
+            build = lambda p: self._period_sketches(timeframe)
+        else:
+            build = lambda p: self._period_peers(timeframe, self.ratio_cube(timeframe))
+        return self.cache.get(path, build, variant=variant, cached_only=self._cached_only)
+
+    def _period_peers(self, timeframe: str, cube: RatioCube) -> Dict[str, PeerDistribution]:
+        """
+        Exact peer universes of every period, updated incrementally from the previous
+        dataset version: a period whose companies all kept their values reuses its
+        universe, any other period is rebuilt.
+        """
+        previous = self._peer_state.get(timeframe, {})
+        metrics = list(cube.metrics)
+        current: Dict[str, _PeriodPeers] = {}
+        reused = 0
+        for p, period in enumerate(cube.periods):
+            values = cube.values[:, :, p]
+            filed = ~np.isnan(values).all(axis=1)
+            values, companies = values[filed], cube.companies[filed]
+            fingerprints = _row_fingerprints(values)
+
+            state = previous.get(period)
+            if (
+                state is not None
+                and state.metrics == metrics
+                and isinstance(state.dist, PeerDistribution)
+                and state.companies.equals(companies)
+                and np.array_equal(state.fingerprints, fingerprints)
+            ):
+                dist = state.dist
+                reused += 1
+            else:
+                dist = PeerDistribution.from_values(values, metrics)
+            current[period] = _PeriodPeers(metrics, companies, fingerprints, dist)
+
+        self._peer_state[timeframe] = current
+        if previous:
+            logger.info("Peer universes (%s): %d periods, %d reused, %d rebuilt", timeframe, len(current), reused, len(current) - reused)
+        return {period: state.dist for period, state in current.items()}
+
+    def _ratio_chunks(self, timeframe: str, size: int = RISK_PEER_CHUNK_COMPANIES) -> Iterator[RatioCube]:
+        """
+        The ratios dataset as RatioCubes over consecutive chunks of `size` companies,
+        read past the cache so that no more than one chunk is decoded at a time. With the
+        monolithic layout each chunk is a filtered scan of the base file and its delta
+        fragments (memory-mapped when mirrored).
+        """
+        companies = self.companies(timeframe)
+        if self.layout == "monolithic":
+            base_path = ratios_path(timeframe, self.base)
+            paths = (self._resolve(base_path), *self._fragments(base_path))
+        for start in range(0, len(companies), size):
+            chunk = companies[start : start + size]
+            if self.layout == "partitioned":
+                parts = [merge_partition_rows(self._read(self.source("ratios", c, timeframe))) for c in chunk]
+                df = pd.concat([ratios_from_partition(part, c) for part, c in zip(parts, chunk)]).sort_index(axis=1)
+            else:
+
+                def plan(schema: pa.Schema):
+                    index_cols = _index_columns(schema)
+                    return None, ds.field(index_cols[0]).isin(chunk)
+
+                frames = []
+                for path in paths:
+                    frame = self._read(path, plan)
+                    frame.columns = pd.DatetimeIndex(frame.columns).to_period(_dates_freq(frame.columns, timeframe)).astype(str)
+                    frames.append(frame)
+                df = merge_fragments("ratios", frames)
+            yield RatioCube.from_frame(df)
+
+    def _period_sketches(self, timeframe: str) -> Dict[str, SketchDistribution]:
+        """
+        Sketch peer universes of every period, built from the ratios dataset a chunk of
+        companies at a time (_ratio_chunks), so the dense cube of the whole universe is
+        never materialized. A first pass fingerprints every filed (company, period) row.
+        Against the previous dataset version, a period whose companies all kept their
+        values reuses its sketch, one that only gained companies (new filings) has just
+        their rows added to a copy, and any other period is rebuilt (a sketch cannot
+        forget values); a second pass feeds those rows.
+        """
+        previous = self._peer_state.get(timeframe, {})
+        filed_companies: Dict[str, List[pd.Index]] = {}
+        filed_fingerprints: Dict[str, List[np.ndarray]] = {}
+        for chunk in self._ratio_chunks(timeframe):
+            fingerprints = _keyed_fingerprints(chunk)
+            filed = ~np.isnan(chunk.values).all(axis=1)
+            for p, period in enumerate(chunk.periods):
+                filed_companies.setdefault(period, []).append(chunk.companies[filed[:, p]])
+                filed_fingerprints.setdefault(period, []).append(fingerprints[filed[:, p], p])
+
+        current: Dict[str, _PeriodPeers] = {}
+        # companies whose rows each period's sketch still needs
+        pending: Dict[str, pd.Index] = {}
+        reused = updated = 0
+        for period in sorted(filed_companies):
+            chunks = filed_companies[period]
+            companies = chunks[0].append(chunks[1:]) if len(chunks) > 1 else chunks[0]
+            fingerprints = np.concatenate(filed_fingerprints[period])
+
+            dist, add = None, companies
+            state = previous.get(period)
+            if state is not None and state.metrics is None and isinstance(state.dist, SketchDistribution) and state.dist.k == self.peer_sketch_k:
+                pos = companies.get_indexer(state.companies)
+                if (pos >= 0).all() and np.array_equal(fingerprints[pos], state.fingerprints):
+                    new = np.ones(len(companies), dtype=bool)
+                    new[pos] = False
+                    add = companies[new]
+                    if add.empty:
+                        dist = state.dist
+                        reused += 1
+                    else:
+                        # the cached sketch may still be in use: add to a copy
+                        dist = state.dist.copy()
+                        updated += 1
+            if dist is None:
+                dist = SketchDistribution({}, k=self.peer_sketch_k)
+            if not add.empty:
+                pending[period] = add
+            current[period] = _PeriodPeers(None, companies, fingerprints, dist)
+
+        if pending:
+            for chunk in self._ratio_chunks(timeframe):
+                metrics = list(chunk.metrics)
+                for p, period in enumerate(chunk.periods):
+                    if period in pending:
+                        rows = chunk.companies.isin(pending[period])
+                        if rows.any():
+                            current[period].dist.update(chunk.values[rows, :, p], metrics)
+
+        self._peer_state[timeframe] = current
+        if previous:
+            logger.info(
+                "Peer sketches (%s): %d periods, %d reused, %d updated, %d rebuilt",
+                timeframe, len(current), reused, updated, len(current) - reused - updated,
+            )
+        return {period: state.dist for period, state in current.items()}
+
+    def risk_history(self, timeframe: str, peers: str = "period") -> pd.DataFrame:
+        """
+        Risk category scores of every company and ratios period ((company, period) rows,
+        one column per RATIO_GROUPS category), scored in one batch pass over the ratio cube
+        once per dataset version (with period peers: the percentile scores of risk_cube).
+        `peers` is "period" (every company of the same period) or "none"; periods a
+        company has no ratios for are left out.
+        """
+        if peers not in ("period", "none"):
+            raise ValueError("peers must be 'period'|'none'")
+        path, variant = self._universe_key(timeframe, ("risk_history", peers))
+
+        def build(_path: str) -> pd.DataFrame:
+            cube = self.ratio_cube(timeframe)
+            if peers == "none":
+                return calculate_category_scores_batch(cube.panel().dropna(how="all"), RATIO_GROUPS)
+            risk = self.risk_cube(timeframe)
+            filed = ~np.isnan(cube.values).all(axis=1)
+            index = pd.MultiIndex.from_product([risk.companies, risk.periods], names=["company", "period"])
+            scores = risk.scores[risk.methods.index("percentile")].reshape(-1, len(risk.categories))
+            return pd.DataFrame(scores, index=index, columns=list(risk.categories))[filed.ravel()]
+
+        return self.cache.get(path, build, variant=variant, cached_only=self._cached_only)
+
+    def risk_cube(self, timeframe: str) -> RiskCube:
+        """
+        Category scores and per-metric contributions of every company, period and
+        normalization method (peers: every company of the period), computed once per
+        dataset version. After the first build only the periods with changed (company,
+        period) cells are rescored (RiskCube.recompute).
+        """
+        path, variant = self._universe_key(timeframe, "risk_cube")
+
+        def build(_path: str) -> RiskCube:
+            cube = self.ratio_cube(timeframe)
+            peers = self.peer_distributions(timeframe)
+            fingerprints = _cell_fingerprints(cube)
+            state = self._risk_state.get(timeframe)
+            if state is not None and state.metrics.equals(cube.metrics):
+                cells = state.changed_cells(cube, fingerprints)
+                risk = state.risk.recompute(cube, RATIO_GROUPS, peers, cells)
+                logger.info("Risk cube (%s): %d changed cells, rescored %d periods", timeframe, len(cells), len({p for _, p in cells}))
+            else:
+                risk = RiskCube.build(cube, RATIO_GROUPS, peers)
+            self._risk_state[timeframe] = _RiskState(cube.companies, cube.metrics, cube.periods, fingerprints, risk)
+            return risk
+
+        return self.cache.get(path, build, variant=variant, cached_only=self._cached_only)
+
+    def period_catalog(self, kind: str, company: str, timeframe: str) -> PeriodCatalog:
+        """
+        Period positions of the company's full ratios (columns) or metrics (rows) frame,
+        built once per dataset version.
+        """
+        if kind == "ratios":
+            labels = lambda: self.company_ratios(company, timeframe).columns
+        elif kind == "metrics":
+            labels = lambda: self.company_metrics(company, timeframe).index.astype(str)
+        else:
+            raise ValueError("kind must be 'ratios'|'metrics'")
+        return self.cache.get(
+            self.source(kind, company, timeframe),
+            lambda p: PeriodCatalog(labels()),
+            variant=self._derived_variant(kind, timeframe, ("period_catalog", kind, company)),
+            cached_only=self._cached_only,
+        )
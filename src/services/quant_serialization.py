@@ -0,0 +1,63 @@
+"""
+Response encodings for the quant endpoints.
+
+The default "records" format (one dict per row) is what the dashboard has always
+consumed. Heavier clients can opt into:
+
+- "columnar": {<index name>: [...], "columns": {name: [...]}}; numeric columns stay
+  numpy arrays, which orjson writes directly (OPT_SERIALIZE_NUMPY, NaN/inf -> null),
+  instead of being boxed into a list of Python objects.
+- "arrow": the same columnar payload as an Arrow IPC stream.
+"""
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+RESPONSE_FORMATS = ("records", "columnar", "arrow")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _column(values: np.ndarray) -> Union[np.ndarray, List[Any]]:
+    """
+    Column values for a columnar payload: a contiguous numpy array for numeric columns
+    (orjson cannot write strided or object arrays), otherwise a list with missing
+    values as None.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "fiub":
+        return np.ascontiguousarray(values)
+    out = values.astype(object)
+    out[pd.isna(values)] = None
+    return out.tolist()
+
+
+def to_columnar(frame: pd.DataFrame, index_name: str, index_values: List[str]) -> Dict[str, Any]:
+    """Columnar payload: the index vector under `index_name` plus one array per column."""
+    return {
+        index_name: list(index_values),
+        "columns": {str(col): _column(frame[col].to_numpy()) for col in frame.columns},
+    }
+
+
+def is_columnar(payload: Any) -> bool:
+    return isinstance(payload, dict) and isinstance(payload.get("columns"), dict) and len(payload) == 2
+
+
+def columnar_to_arrow(payload: Dict[str, Any]) -> bytes:
+    """Encode a columnar payload as an Arrow IPC stream (index vector first)."""
+    index_name = next(k for k in payload if k != "columns")
+    arrays = {index_name: pa.array(payload[index_name], type=pa.string())}
+    for name, values in payload["columns"].items():
+        if isinstance(values, np.ndarray) and values.dtype.kind == "f":
+            # null like in the JSON payload
+            arrays[name] = pa.array(values, mask=~np.isfinite(values))
+        else:
+            arrays[name] = pa.array(values)
+    table = pa.table(arrays)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
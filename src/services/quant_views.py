@@ -0,0 +1,342 @@
+"""
+Quant dashboard views (charts, ratios, performance, risk matrix).
+
+Each view turns a QuantDataReader slice into the JSON-ready payload returned by the
+API, either as row records (default) or as columnar arrays (response_format="columnar",
+see quant_serialization). They are shared by the Celery tasks and the inline fast
+path in main.py, so both produce identical responses.
+"""
+import math
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from src.core.constants import RATIO_GROUPS
+from src.core.logger import configure_logging
+from src.services.chart_downsampling import downsample
+from src.services.dataset_cache import CacheMiss
+from src.services.market_analytics import ANALYTICS_METRICS, default_window
+from src.services.period_catalog import period_label
+from src.services.quant_reader import QuantDataReader
+from src.services.quant_serialization import to_columnar
+from src.services.risk_matrix import PeerDistribution, SketchDistribution, calculate_category_scores, calculate_category_scores_batch
+
+# peer universe of the risk scores: every company in the same period, the company's own
+# trailing periods, or none (within-category min-max of the company's own metrics)
+RISK_PEER_UNIVERSES = ("period", "trailing", "none")
+DEFAULT_TRAILING_PERIODS = 8
+
+logger = configure_logging()
+
+
+def _chart_payload(out: pd.DataFrame, response_format: str):
+    """`out` is a DatetimeIndex frame with one column per chart variable."""
+    if response_format == "columnar":
+        return to_columnar(out, "date", out.index.astype(str))
+
+    out = out.copy()
+    out["date"] = out.index.astype(str) # Convert to string for JSON serialization
+    out = out.replace([np.inf, -np.inf, np.nan], None)
+    return out.reset_index(drop=True).to_dict(orient="records")
+
+
+def charts_view(
+    reader: QuantDataReader,
+    company: str,
+    variables: list,
+    timeframe: str,
+    max_points: Optional[int] = None,
+    response_format: str = "records",
+):
+    """
+    Chart records for the selected variables. With `max_points` the series comes from
+    the finest resolution-pyramid level that fits, reduced further with LTTB (lines) or
+    OHLC bucketing (candles) when even the coarsest level is too long.
+    """
+    if max_points:
+        out = downsample(reader.stock_pyramid(company, variables, timeframe), variables, max_points)
+        if len(out.columns) == 0:
+            return []
+        return _chart_payload(out, response_format)
+
+    df = reader.stock_series(company, variables, timeframe)
+
+    dates = df.index.to_timestamp() if isinstance(df.index, pd.PeriodIndex) else df.index
+
+    selected = [(var, company) for var in variables if (var, company) in df.columns]
+    if not selected:
+        return []
+
+    out = df[selected].copy()
+    out.index = dates
+    out.columns = [col[0] for col in selected]
+
+    return _chart_payload(out.sort_index(), response_format)
+
+
+def ratios_payload(df: pd.DataFrame, company: str, variables: list, response_format: str = "records"):
+    if not isinstance(df.index, pd.MultiIndex):
+        raise ValueError("Expected MultiIndex index in ratios parquet")
+
+    df_company = df.xs(company, level=0)
+    if variables:
+        df_company = df_company.reindex(variables)
+
+    if response_format == "columnar":
+        return to_columnar(df_company, "metric", df_company.index.astype(str))
+
+    df_company = df_company.replace([np.inf, -np.inf, np.nan], None)
+
+    return df_company.reset_index().to_dict(orient='records')
+
+
+def performance_payload(df: pd.DataFrame, company: str, positions: List[int], response_format: str = "records"):
+    """Rows of the company's metrics frame at `positions` (see PeriodCatalog)."""
+    if not isinstance(df.columns, pd.MultiIndex):
+        return {}
+
+    df_company = df.xs(company, level=1, axis=1)
+    df_company_period = df_company.iloc[positions]
+    df_company_period.index = df_company_period.index.astype(str)
+
+    if response_format == "columnar":
+        return to_columnar(df_company_period, "period", df_company_period.index)
+
+    df_company_period = df_company_period.replace([np.inf, -np.inf, np.nan], None)
+
+    return df_company_period.reset_index().to_dict(orient='records')
+
+
+def risk_payload(df: pd.DataFrame, company: str, position: int, peers: Optional[Union[PeerDistribution, SketchDistribution]] = None):
+    """Risk category scores of the company's ratios column at `position` (see PeriodCatalog)."""
+    if not isinstance(df.index, pd.MultiIndex):
+        return {}
+
+    df_company = df.xs(company, level=0, axis=0)
+    df_company_period = df_company.iloc[:, position]
+
+    result = calculate_category_scores(df_company_period, RATIO_GROUPS, peers_df=peers)
+    return _json_scores(result["category_scores"])
+
+
+def risk_payloads(
+    df: pd.DataFrame,
+    company: str,
+    labels: Sequence[str],
+    peers: Optional[Mapping[str, Union[PeerDistribution, SketchDistribution]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    risk_payload for every ratios column of the company (in position order, `labels` being
+    their period labels), scored in one batch against the peer universe of each label.
+    """
+    if not isinstance(df.index, pd.MultiIndex):
+        return []
+
+    panel = df.xs(company, level=0, axis=0).T
+    scores = calculate_category_scores_batch(panel, RATIO_GROUPS, peers_df=peers, peer_groups=list(labels) if peers is not None else None)
+    return [_json_scores(row) for row in scores.to_dict(orient="records")]
+
+
+def risk_peers(reader: QuantDataReader, ratios: pd.DataFrame, company: str, position: int, timeframe: str, peers: str, trailing: int) -> Optional[Union[PeerDistribution, SketchDistribution]]:
+    """
+    Peer universe of the company's ratios column at `position`: every company in the same
+    period ("period"), the company's own last `trailing` periods up to it ("trailing"), or
+    none ("none": within-category min-max of the company's own metrics).
+    """
+    if peers == "period":
+        label = reader.period_catalog("ratios", company, timeframe).labels[position]
+        return reader.peer_distributions(timeframe).get(label)
+    if peers == "trailing":
+        window = ratios.xs(company, level=0, axis=0).iloc[:, max(0, position - trailing + 1):position + 1]
+        return PeerDistribution.from_frame(window)
+    if peers == "none":
+        return None
+    raise ValueError(f"peers must be one of {RISK_PEER_UNIVERSES}")
+
+
+def _json_scores(scores: Dict[str, Any]) -> Dict[str, Any]:
+    # categories without enough metrics score NaN, which is not valid JSON
+    return {cat: (None if isinstance(score, float) and math.isnan(score) else score) for cat, score in scores.items()}
+
+
+def ratios_view(reader: QuantDataReader, company: str, timeframe: str, variables: list, response_format: str = "records"):
+    return ratios_payload(reader.company_ratios(company, timeframe), company, variables, response_format)
+
+
+def _performance(reader: QuantDataReader, company: str, period: str, timeframe: str, response_format: str):
+    # a period the company has no row for yields an empty payload
+    pos = reader.period_catalog("metrics", company, timeframe).get(period)
+    return performance_payload(reader.company_metrics(company, timeframe), company, [] if pos is None else [pos], response_format)
+
+
+def performance_view(reader: QuantDataReader, company: str, period: str, timeframe: str, response_format: str = "records"):
+    return _performance(reader, company, period, timeframe, response_format)
+
+
+def _risk(reader: QuantDataReader, company: str, period: str, timeframe: str, peers: str, trailing: int, ratios: Optional[pd.DataFrame] = None):
+    # KeyError for a period the dataset does not have
+    catalog = reader.period_catalog("ratios", company, timeframe)
+    pos = catalog.position(period)
+    if peers == "period":
+        # same-period peer scores are precomputed in the risk cube
+        scores = reader.risk_cube(timeframe).category_scores(company, catalog.labels[pos])
+        if scores is not None:
+            return _json_scores(scores)
+    if ratios is None:
+        ratios = reader.company_ratios(company, timeframe)
+    return risk_payload(ratios, company, pos, risk_peers(reader, ratios, company, pos, timeframe, peers, trailing))
+
+
+def risk_matrix_view(
+    reader: QuantDataReader,
+    company: str,
+    period: str,
+    timeframe: str,
+    peers: str = "period",
+    trailing: int = DEFAULT_TRAILING_PERIODS,
+):
+    """
+    Category risk scores of the company in `period` against the chosen peer universe
+    (see RISK_PEER_UNIVERSES); the ratios driving them come from risk_drivers_view.
+    """
+    return _risk(reader, company, period, timeframe, peers, trailing)
+
+
+def risk_drivers_view(reader: QuantDataReader, company: str, period: str, timeframe: str, top_n: int = 5, method: str = "percentile"):
+    """
+    The `top_n` ratios pushing the company's risk up the most in `period` (lowest
+    normalized value against every company of the period), highest risk first.
+    """
+    catalog = reader.period_catalog("ratios", company, timeframe)
+    drivers = reader.risk_cube(timeframe).top_drivers(company, catalog.labels[catalog.position(period)], top_n, method)
+    return drivers or []
+
+
+def ratio_comparison_view(
+    reader: QuantDataReader,
+    companies: list,
+    variables: list,
+    periods: list,
+    timeframe: str,
+    response_format: str = "records",
+):
+    """
+    Chosen ratios for any set of companies and periods, sliced from the ratio cube.
+    Empty lists select every company / ratio / period. Records are one row per
+    (company, metric); the columnar format returns the dense cube payload.
+    """
+    cube = reader.ratio_cube(timeframe).select(
+        companies or None,
+        variables or None,
+        [period_label(p) for p in periods] if periods else None,
+    )
+    return cube.to_payload() if response_format == "columnar" else cube.to_records()
+
+
+def market_analytics_view(
+    reader: QuantDataReader,
+    companies: list,
+    metrics: list,
+    timeframe: str,
+    window: Optional[int] = None,
+    response_format: str = "records",
+):
+    """
+    Rolling return, volatility, drawdown and peer beta per date and company, sliced from
+    the analytics frame cached per stocks dataset version. Empty lists select every
+    company / metric; unknown ones are skipped.
+    """
+    frame = reader.market_analytics(timeframe, window or default_window(timeframe))
+    metrics = [m for m in (metrics or ANALYTICS_METRICS) if m in ANALYTICS_METRICS]
+    available = frame.columns.get_level_values("company").unique()
+    companies = [c for c in companies if c in available] if companies else list(available)
+    if not metrics or not companies:
+        return []
+
+    long = frame.loc[:, pd.MultiIndex.from_product([metrics, companies])].stack(level="company", future_stack=True)
+    long = long.reset_index(level="company")[["company", *metrics]]
+    dates = long.index.astype(str)
+
+    if response_format == "columnar":
+        return to_columnar(long, "date", dates)
+
+    long = long.replace([np.inf, -np.inf, np.nan], None)
+    long.insert(0, "date", dates)
+    return long.to_dict(orient="records")
+
+
+def risk_history_view(
+    reader: QuantDataReader,
+    companies: list,
+    timeframe: str,
+    peers: str = "period",
+    response_format: str = "records",
+):
+    """
+    Category risk scores of every period for the requested companies (empty list: every
+    company), one row per (company, period), sliced from the risk history cached per
+    ratios dataset version. Unknown companies are skipped.
+    """
+    history = reader.risk_history(timeframe, peers)
+    if companies:
+        history = history[history.index.get_level_values("company").isin(companies)]
+
+    long = history.reset_index(level="company")
+    periods = long.index.astype(str)
+
+    if response_format == "columnar":
+        return to_columnar(long, "period", periods)
+
+    long = long.replace([np.inf, -np.inf, np.nan], None)
+    long.insert(0, "period", periods)
+    return long.to_dict(orient="records")
+
+
+def dashboard_view(
+    reader: QuantDataReader,
+    company: str,
+    period: str,
+    timeframe: str,
+    chart_variables: list,
+    ratio_variables: list,
+    chart_timeframe: str,
+    max_points: Optional[int] = None,
+    response_format: str = "records",
+) -> Dict[str, Any]:
+    """
+    All four dashboard views for one company in a single pass. The company's ratio
+    rows are loaded once and shared by the ratios table and the risk matrix.
+
+    Sections are built independently: a period the ratios dataset does not have leaves
+    an empty risk matrix (like performance), and a section that fails degrades to its
+    empty payload with the error under "errors", so the other widgets still render.
+    """
+    errors: Dict[str, str] = {}
+
+    def section(name: str, empty: Any, build: Callable[[], Any]) -> Any:
+        try:
+            return build()
+        except CacheMiss:
+            # the inline fast path falls back to the task
+            raise
+        except Exception as e:
+            logger.warning("Dashboard section %s failed for %s %s: %r", name, company, period, e)
+            errors[name] = repr(e)
+            return empty
+
+    def risk_matrix() -> Dict[str, Any]:
+        if reader.period_catalog("ratios", company, timeframe).get(period) is None:
+            return {}
+        return _risk(reader, company, period, timeframe, "period", DEFAULT_TRAILING_PERIODS, ratios)
+
+    ratios = section("ratios", None, lambda: reader.company_ratios(company, timeframe))
+    payload = {
+        "charts": section("charts", [], lambda: charts_view(reader, company, chart_variables, chart_timeframe, max_points, response_format) if chart_variables else []),
+        "ratios": [] if ratios is None else section("ratios", [], lambda: ratios_payload(ratios, company, ratio_variables, response_format)),
+        "performance": section("performance", [], lambda: _performance(reader, company, period, timeframe, response_format)),
+        "risk_matrix": section("risk_matrix", {}, risk_matrix),
+    }
+    if errors:
+        payload["errors"] = errors
+    return payload
@@ -0,0 +1,165 @@
+"""
+Mergeable streaming quantile sketch (KLL, Karnin-Lang-Liberty 2016).
+
+A KLLSketch keeps a bounded sample of the values it has seen in a stack of compactors:
+level h holds items of weight 2**h, and a level that grows past its capacity is sorted
+and every other item is promoted to the next level. Memory stays around 3*k items
+whatever the number of values; ranks and quantiles are answered from the sorted items
+with a binary search, with a rank error of roughly 1.7/k. Two sketches merge by
+concatenating their levels, so sketches built on separate batches (or partitions) can
+be combined, and new values can be added at any time.
+
+Until the first compaction (at most k values) the sketch holds every value with weight
+1 and its answers equal the exact numpy ones. Count, mean, standard deviation, min and
+max are tracked exactly.
+"""
+import math
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_K = 200
+# capacity decay between levels and smallest level capacity
+_DECAY = 2.0 / 3.0
+_MIN_CAPACITY = 8
+
+
+class KLLSketch:
+    def __init__(self, k: int = DEFAULT_K):
+        if k < _MIN_CAPACITY:
+            raise ValueError(f"k must be at least {_MIN_CAPACITY}")
+        self.k = k
+        self.count = 0
+        self.mean = 0.0
+        # sum of squared deviations from the mean (Chan et al. parallel variance)
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._levels: List[np.ndarray] = [np.empty(0)]
+        # alternating compaction offset per level, so results are reproducible
+        self._offsets: List[int] = [0]
+        # sorted items and cumulative weights (leading 0), rebuilt after each change
+        self._view: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    # ---------------- building ----------------
+    def update(self, values: Any) -> "KLLSketch":
+        """Add values (NaNs are ignored)."""
+        arr = np.asarray(values, dtype=float).ravel()
+        arr = arr[~np.isnan(arr)]
+        if arr.size == 0:
+            return self
+        batch_mean = float(arr.mean())
+        batch_m2 = float(((arr - batch_mean) ** 2).sum())
+        self._add_moments(arr.size, batch_mean, batch_m2)
+        self.min = min(self.min, float(arr.min()))
+        self.max = max(self.max, float(arr.max()))
+        self._levels[0] = np.concatenate([self._levels[0], arr])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold `other` into this sketch (`other` is left unchanged)."""
+        if other.count == 0:
+            return self
+        self._add_moments(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for h, level in enumerate(other._levels):
+            if h == len(self._levels):
+                self._levels.append(np.empty(0))
+                self._offsets.append(0)
+            self._levels[h] = np.concatenate([self._levels[h], level])
+        self._compress()
+        return self
+
+    def copy(self) -> "KLLSketch":
+        out = KLLSketch(self.k)
+        out.count, out.mean, out.m2, out.min, out.max = self.count, self.mean, self.m2, self.min, self.max
+        out._levels = list(self._levels)
+        out._offsets = list(self._offsets)
+        return out
+
+    def _add_moments(self, n: int, mean: float, m2: float) -> None:
+        if self.count == 0:
+            self.count, self.mean, self.m2 = n, mean, m2
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self._levels) - 1 - h
+        return max(_MIN_CAPACITY, int(math.ceil(self.k * _DECAY**depth)))
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self._levels):
+            level = self._levels[h]
+            if level.size > self._capacity(h):
+                if h + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                    self._offsets.append(0)
+                level = np.sort(level)
+                # an odd item out stays at this level, the rest pairs up into the next one
+                odd = level.size % 2
+                offset = self._offsets[h]
+                self._offsets[h] = 1 - offset
+                self._levels[h + 1] = np.concatenate([self._levels[h + 1], level[offset : level.size - odd : 2]])
+                self._levels[h] = level[level.size - odd :]
+            h += 1
+        self._view = None
+
+    # ---------------- queries ----------------
+    @property
+    def exact(self) -> bool:
+        """True while every value is still held (no compaction yet)."""
+        return len(self._levels) == 1
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self._levels)
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation (ddof=0)."""
+        return math.sqrt(self.m2 / self.count) if self.count else math.nan
+
+    def _sorted(self) -> Tuple[np.ndarray, np.ndarray]:
+        view = self._view
+        if view is None:
+            items = np.concatenate(self._levels)
+            weights = np.concatenate([np.full(level.size, 2**h, dtype=np.int64) for h, level in enumerate(self._levels)])
+            order = np.argsort(items, kind="stable")
+            view = self._view = (items[order], np.concatenate([[0], np.cumsum(weights[order])]))
+        return view
+
+    def ranks(self, values: Any) -> np.ndarray:
+        """
+        Percentile rank in [0,1] of each value, ties counted at their midpoint:
+          (weight_less + 0.5*weight_equal) / count
+        """
+        items, cum = self._sorted()
+        less = cum[np.searchsorted(items, values, side="left")]
+        less_equal = cum[np.searchsorted(items, values, side="right")]
+        return (less + 0.5 * (less_equal - less)) / self.count
+
+    def percentile(self, p: float) -> float:
+        """
+        The p-th percentile (0..100) with numpy's default linear interpolation; exact
+        while the sketch has not compacted.
+        """
+        if self.count == 0:
+            return math.nan
+        if self.exact:
+            return float(np.percentile(self._levels[0], p))
+        items, cum = self._sorted()
+        pos = (p / 100.0) * (self.count - 1)
+        lo = math.floor(pos)
+        # item holding 0-based rank r: the first whose cumulative weight exceeds r
+        i = min(int(np.searchsorted(cum[1:], lo, side="right")), items.size - 1)
+        j = min(int(np.searchsorted(cum[1:], lo + 1, side="right")), items.size - 1)
+        value = float(items[i] + (pos - lo) * (items[j] - items[i]))
+        # the extremes are known exactly even when their items were compacted away
+        return min(max(value, self.min), self.max)
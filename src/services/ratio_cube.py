@@ -0,0 +1,101 @@
+"""
+Dense company x metric x period cube of the ratios dataset.
+
+The ratios parquet is a (company, metric) x period frame, so comparing several
+companies with pandas means one cross-section and reindex per company. RatioCube
+lays the same values out as a float64 array with sorted label axes, built once per
+dataset version, so any comparison (tickers x ratios x periods) is a single fancy-index
+slice of that array.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class RatioCube:
+    companies: pd.Index
+    metrics: pd.Index
+    periods: pd.Index
+    # shape (companies, metrics, periods); NaN where a company has no value
+    values: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "RatioCube":
+        """Build from a (company, metric) x period-label frame as returned by the ratios readers."""
+        if not isinstance(df.index, pd.MultiIndex):
+            raise ValueError("Expected MultiIndex index in ratios parquet")
+        companies = pd.Index(df.index.get_level_values(0).astype(str).unique()).sort_values()
+        metrics = pd.Index(df.index.get_level_values(1).astype(str).unique()).sort_values()
+        periods = pd.Index(df.columns.astype(str))
+
+        values = np.full((len(companies), len(metrics), len(periods)), np.nan)
+        company_pos = companies.get_indexer(df.index.get_level_values(0).astype(str))
+        metric_pos = metrics.get_indexer(df.index.get_level_values(1).astype(str))
+        values[company_pos, metric_pos, :] = df.to_numpy(dtype=float, na_value=np.nan)
+        return cls(companies, metrics, periods, values)
+
+    def panel(self) -> pd.DataFrame:
+        """(company, period) rows x metric columns, e.g. for batch risk scoring."""
+        n_companies, n_metrics, n_periods = self.values.shape
+        index = pd.MultiIndex.from_product([self.companies, self.periods], names=["company", "period"])
+        flat = self.values.transpose(0, 2, 1).reshape(n_companies * n_periods, n_metrics)
+        return pd.DataFrame(flat, index=index, columns=self.metrics)
+
+    def select(
+        self,
+        companies: Optional[Sequence[str]] = None,
+        metrics: Optional[Sequence[str]] = None,
+        periods: Optional[Sequence[str]] = None,
+    ) -> "RatioCube":
+        """
+        Sub-cube in the requested label order (None keeps a whole axis). Labels missing
+        from the cube are kept and filled with NaN, like a pandas reindex.
+        """
+        axes = []
+        positions = []
+        for own, wanted in ((self.companies, companies), (self.metrics, metrics), (self.periods, periods)):
+            labels = own if wanted is None else pd.Index([str(w) for w in wanted])
+            axes.append(labels)
+            positions.append(np.arange(len(own)) if wanted is None else own.get_indexer(labels))
+
+        if 0 in self.values.shape:
+            return RatioCube(axes[0], axes[1], axes[2], np.full(tuple(len(a) for a in axes), np.nan))
+
+        # one gather; unknown labels (position -1) read slot 0 and are blanked afterwards
+        values = self.values[np.ix_(*[np.maximum(p, 0) for p in positions])]
+        if values.size:
+            for axis, p in enumerate(positions):
+                missing = np.flatnonzero(p < 0)
+                if missing.size:
+                    index = [slice(None)] * 3
+                    index[axis] = missing
+                    values[tuple(index)] = np.nan
+        return RatioCube(axes[0], axes[1], axes[2], values)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """One row per (company, metric) with a value per period; NaN becomes None."""
+        flat = self.values.reshape(-1, len(self.periods)).astype(object)
+        flat[pd.isna(flat)] = None
+        rows = []
+        for i, (company, metric) in enumerate((c, m) for c in self.companies for m in self.metrics):
+            rows.append({"company": company, "metric": metric, **dict(zip(self.periods, flat[i].tolist()))})
+        return rows
+
+    def to_payload(self) -> Dict[str, Any]:
+        """
+        Dense payload: label axes plus values nested [company][metric][period], as a numpy
+        array that orjson writes directly (NaN becomes null).
+        """
+        return {
+            "companies": list(self.companies),
+            "metrics": list(self.metrics),
+            "periods": list(self.periods),
+            "values": np.ascontiguousarray(self.values, dtype=float),
+        }
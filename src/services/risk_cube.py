@@ -0,0 +1,174 @@
+"""
+Precomputed risk cube: category risk scores and per-metric contributions of every
+company x period x normalization method.
+
+calculate_category_scores computes per-metric diagnostics and then discards them.
+RiskCube keeps them in compact arrays, built once per ratios dataset version in one
+batch pass over the ratio cube (peers: every company of the same period). Risk matrix
+lookups are then a single index, and "top N risk drivers" is an argpartition over one
+contributions vector instead of rescoring from the raw ratios. When a few (company,
+period) cells change, recompute() rescores only their periods.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.services.ratio_cube import RatioCube
+from src.services.risk_matrix import PeerDistribution, SketchDistribution, calculate_category_scores_batch
+
+NORMALIZE_METHODS = ("percentile", "zscore", "minmax")
+
+
+def _memberships(cube: RatioCube, ratio_groups: Dict[str, List[str]]) -> Dict[str, Tuple[str, ...]]:
+    return {m: tuple(cat for cat, mlist in ratio_groups.items() if m in mlist) for m in cube.metrics}
+
+
+@dataclass(frozen=True)
+class RiskCube:
+    companies: pd.Index
+    periods: pd.Index
+    # metrics that belong to at least one category, and those categories per metric
+    metrics: pd.Index
+    metric_categories: Tuple[Tuple[str, ...], ...]
+    categories: Tuple[str, ...]
+    methods: Tuple[str, ...]
+    # (methods, companies, periods, categories) risk scores, NaN where not scored
+    scores: np.ndarray
+    # (methods, companies, periods, metrics) normalized 0..1 contributions, NaN where not scored
+    contributions: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.scores.nbytes + self.contributions.nbytes)
+
+    @classmethod
+    def build(
+        cls,
+        cube: RatioCube,
+        ratio_groups: Dict[str, List[str]],
+        peers: Optional[Mapping[str, Union[PeerDistribution, SketchDistribution]]] = None,
+        methods: Sequence[str] = NORMALIZE_METHODS,
+    ) -> "RiskCube":
+        """Score every (company, period) of `cube` once per method, against `peers` of its period."""
+        panel = cube.panel()
+        periods = panel.index.get_level_values("period")
+        memberships = _memberships(cube, ratio_groups)
+        metrics = pd.Index([m for m in cube.metrics if memberships[m]])
+        scored = cube.metrics.get_indexer(metrics)
+
+        shape = (len(cube.companies), len(cube.periods))
+        scores, contributions = [], []
+        for method in methods:
+            frame, contrib = calculate_category_scores_batch(
+                panel,
+                ratio_groups,
+                peers_df=peers,
+                peer_groups=periods if peers is not None else None,
+                normalize_method=method,
+                return_contributions=True,
+            )
+            scores.append(frame.to_numpy(dtype=float).reshape(*shape, len(ratio_groups)))
+            # contributions are diagnostics; float32 keeps the cube compact
+            contributions.append(contrib.to_numpy(dtype=np.float32)[:, scored].reshape(*shape, len(metrics)))
+
+        return cls(
+            companies=cube.companies,
+            periods=cube.periods,
+            metrics=metrics,
+            metric_categories=tuple(memberships[m] for m in metrics),
+            categories=tuple(ratio_groups),
+            methods=tuple(methods),
+            scores=np.stack(scores),
+            contributions=np.stack(contributions),
+        )
+
+    def recompute(
+        self,
+        cube: RatioCube,
+        ratio_groups: Dict[str, List[str]],
+        peers: Optional[Mapping[str, Union[PeerDistribution, SketchDistribution]]],
+        cells: Iterable[Tuple[str, str]],
+    ) -> "RiskCube":
+        """
+        The risk cube after the ratios of `cells` ((company, period) pairs) changed. `cube`
+        and `peers` hold the updated ratios and peer universes. A new value shifts the peer
+        percentiles of its whole period, so every company of each affected period is
+        rescored; all other periods are copied from this cube (rows score independently,
+        so the result equals a full build). A change of metrics or categories rebuilds.
+        """
+        memberships = _memberships(cube, ratio_groups)
+        metrics = pd.Index([m for m in cube.metrics if memberships[m]])
+        if tuple(ratio_groups) != self.categories or not metrics.equals(self.metrics):
+            return RiskCube.build(cube, ratio_groups, peers, self.methods)
+
+        affected = pd.Index(sorted({str(period) for _, period in cells})).intersection(cube.periods)
+        shape = (len(self.methods), len(cube.companies), len(cube.periods))
+        scores = np.full((*shape, len(self.categories)), np.nan)
+        contributions = np.full((*shape, len(metrics)), np.nan, dtype=np.float32)
+
+        # companies or periods new to the cube have no values outside the affected periods
+        old_c = self.companies.get_indexer(cube.companies)
+        old_p = self.periods.get_indexer(cube.periods)
+        new_c, new_p = np.flatnonzero(old_c >= 0), np.flatnonzero(old_p >= 0)
+        at_new = (slice(None), new_c[:, None], new_p[None, :])
+        at_old = (slice(None), old_c[new_c][:, None], old_p[new_p][None, :])
+        scores[at_new] = self.scores[at_old]
+        contributions[at_new] = self.contributions[at_old]
+
+        if len(affected):
+            part = RiskCube.build(cube.select(periods=list(affected)), ratio_groups, peers, self.methods)
+            positions = cube.periods.get_indexer(affected)
+            scores[:, :, positions] = part.scores
+            contributions[:, :, positions] = part.contributions
+
+        return RiskCube(
+            companies=cube.companies,
+            periods=cube.periods,
+            metrics=metrics,
+            metric_categories=self.metric_categories,
+            categories=self.categories,
+            methods=self.methods,
+            scores=scores,
+            contributions=contributions,
+        )
+
+    def _locate(self, company: str, period: str, method: str) -> Optional[Tuple[int, int, int]]:
+        m = self.methods.index(method) if method in self.methods else -1
+        c = self.companies.get_indexer([company])[0]
+        p = self.periods.get_indexer([period])[0]
+        return None if min(m, c, p) < 0 else (m, c, p)
+
+    def category_scores(self, company: str, period: str, method: str = "percentile") -> Optional[Dict[str, float]]:
+        """Risk score per category (NaN where not scored); None when the cell is not in the cube."""
+        at = self._locate(company, period, method)
+        if at is None:
+            return None
+        return {cat: float(v) for cat, v in zip(self.categories, self.scores[at])}
+
+    def top_drivers(self, company: str, period: str, n: int, method: str = "percentile") -> Optional[List[Dict[str, Any]]]:
+        """
+        The `n` metrics pushing the company's risk up the most (lowest normalized
+        contribution), highest risk first; None when the cell is not in the cube.
+        """
+        at = self._locate(company, period, method)
+        if at is None:
+            return None
+        risk = 1.0 - self.contributions[at].astype(float)
+        candidates = np.flatnonzero(~np.isnan(risk))
+        n = min(max(int(n), 0), candidates.size)
+        if n == 0:
+            return []
+
+        top = candidates[np.argpartition(-risk[candidates], n - 1)[:n]]
+        top = top[np.argsort(-risk[top], kind="stable")]
+        return [
+            {
+                "metric": self.metrics[j],
+                "categories": list(self.metric_categories[j]),
+                "normalized": round(1.0 - float(risk[j]), 4),
+                "risk": round(100.0 * float(risk[j]), 2),
+            }
+            for j in top
+        ]
@@ -1,29 +1,259 @@
+from src.core.constants import RATIO_GROUPS
 from src.core.logger import configure_logging
-from typing import Dict, List, Optional, Tuple, Any
+from src.services.quantile_sketch import DEFAULT_K, KLLSketch
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Union, Any
 import numpy as np
 import pandas as pd
 import math
+import threading
+import warnings
 from scipy.stats import rankdata
 
 logger = configure_logging()
 
-# small helper
-def _percentile_rank(value: float, arr: np.ndarray) -> float:
+# direction heuristics (expandable)
+def heuristic_higher_is_good(name: str) -> bool:
+    ln = name.lower()
+    # valuation metrics (price-to, p/e, ev-to) usually higher -> more expensive (worse)
+    if any(k in ln for k in ("price-to", "p/e", "p/b", "ev-to", "price to")):
+        return False
+    # typically good if contains these
+    if any(k in ln for k in ("margin", "return", "roe", "roa", "profit", "income", "yield", "growth", "efficiency")):
+        return True
+    # typically bad if contains these
+    if any(k in ln for k in ("debt", "leverage", "capex", "expense", "cost", "volatility", "tracking", "ulcer", "loss", "short")):
+        return False
+    # if name suggests 'per share' treat as positive generally
+    if "per share" in ln or "per-share" in ln:
+        return True
+    # fallback: assume higher is better (we will also normalize sign later)
+    return True
+
+# keywords to treat as absolute-dollar magnitudes
+ABS_KEYWORDS = ("tangible", "working capital", "cash", "total assets", "book value", "market cap", "enterprise value", "value")
+
+class MetricProfiles:
+    """
+    Compiled scoring profile of every metric, built once per (ratio groups, direction
+    overrides): direction, magnitude transform and category membership as arrays aligned
+    to `metrics`, so scoring maps metric names to positions and does no string processing.
+
+      - higher_is_good: direction (override, else heuristic_higher_is_good)
+      - abs_magnitude: dollar-like name (ABS_KEYWORDS), always sign*log10(1+abs);
+                       other metrics are only compressed when |value| >= 1e6
+      - category_positions: per category, positions of its metrics (list order)
+    """
+
+    def __init__(self, ratio_groups: Dict[str, List[str]], direction_map: Optional[Dict[str, bool]] = None):
+        self.direction_map = dict(direction_map or {})
+        self.categories = list(ratio_groups)
+        self.metrics = pd.Index([], dtype=object)
+        self.higher_is_good = np.zeros(0, dtype=bool)
+        self.abs_magnitude = np.zeros(0, dtype=bool)
+        self._lock = threading.Lock()
+        self._add([str(m) for mlist in ratio_groups.values() for m in mlist])
+        self.category_positions = [self.metrics.get_indexer([str(m) for m in mlist]) for mlist in ratio_groups.values()]
+
+    def __len__(self) -> int:
+        return len(self.metrics)
+
+    def _add(self, names: Sequence[str]) -> None:
+        names = [n for n in dict.fromkeys(names) if n not in self.metrics]
+        if not names:
+            return
+        higher = [bool(self.direction_map[n]) if self.direction_map and n in self.direction_map else heuristic_higher_is_good(n) for n in names]
+        absolute = [any(k in n.lower() for k in ABS_KEYWORDS) for n in names]
+        self.higher_is_good = np.concatenate([self.higher_is_good, np.array(higher, dtype=bool)])
+        self.abs_magnitude = np.concatenate([self.abs_magnitude, np.array(absolute, dtype=bool)])
+        # published last: a concurrent positions() never sees a metric without its profile
+        self.metrics = self.metrics.append(pd.Index(names, dtype=object))
+
+    def positions(self, names: Sequence[str]) -> np.ndarray:
+        """Positions of `names` in the registry; metrics seen for the first time are compiled once and appended."""
+        pos = self.metrics.get_indexer(names)
+        if (pos < 0).any():
+            with self._lock:
+                self._add([str(n) for n, p in zip(names, pos) if p < 0])
+            pos = self.metrics.get_indexer(names)
+        return pos
+
+    def transform(self, raw: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Vectorized sign*log10(1+abs) compression and direction flip ("positive = good") of a values x metrics array."""
+        with np.errstate(invalid="ignore"):
+            is_abs = (np.abs(raw) >= 1e6) | self.abs_magnitude[positions]
+            t = np.where(is_abs, np.sign(raw) * np.log10(np.abs(raw) + 1.0), raw)
+        return np.where(self.higher_is_good[positions], t, -t)
+
+
+# distinct (ratio_groups, direction_map) configurations kept compiled; callers normally
+# share one, so a small bound keeps ad-hoc direction maps from growing the memo forever
+PROFILE_CACHE_SIZE = 32
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def _metric_profiles(groups: Tuple[Tuple[str, Tuple[str, ...]], ...], directions: Tuple[Tuple[str, bool], ...]) -> MetricProfiles:
+    return MetricProfiles({cat: list(mlist) for cat, mlist in groups}, dict(directions))
+
+def metric_profiles(ratio_groups: Optional[Dict[str, List[str]]] = None, direction_map: Optional[Dict[str, bool]] = None) -> MetricProfiles:
+    """Memoized (LRU-bounded) MetricProfiles of RATIO_GROUPS (or `ratio_groups`) plus direction overrides."""
+    ratio_groups = RATIO_GROUPS if ratio_groups is None else ratio_groups
+    return _metric_profiles(
+        tuple((cat, tuple(mlist)) for cat, mlist in ratio_groups.items()),
+        tuple(sorted((str(k), bool(v)) for k, v in (direction_map or {}).items())),
+    )
+
+class PeerDistribution:
+    """
+    Peer values per metric, transformed like the scored vectors and sorted once, so the
+    percentile rank of any number of values is a binary search (np.searchsorted)
+    instead of a scan over the peers.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        # transformed values in peer order (winsor bounds, mean/std) and sorted (ranks)
+        self.arrays = arrays
+        self.sorted = {name: np.sort(arr) for name, arr in arrays.items()}
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, names: List[str], direction_map: Optional[Dict[str, bool]] = None) -> "PeerDistribution":
+        """From a peers x metrics array; NaNs are dropped per metric."""
+        profiles = metric_profiles(direction_map=direction_map)
+        transformed = profiles.transform(np.asarray(values, dtype=float), profiles.positions(names))
+        arrays = {}
+        for j, name in enumerate(names):
+            col = transformed[:, j]
+            col = col[~np.isnan(col)]
+            if col.size > 0:
+                arrays[name] = col
+        return cls(arrays)
+
+    @classmethod
+    def from_frame(cls, peers_df: pd.DataFrame, direction_map: Optional[Dict[str, bool]] = None) -> "PeerDistribution":
+        """From a DataFrame indexed by metric names with one column per peer entity."""
+        peers = peers_df.T.apply(pd.to_numeric, errors="coerce")
+        return cls.from_values(peers.to_numpy(dtype=float), [str(m) for m in peers.columns], direction_map)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(arr.nbytes for arr in self.arrays.values()) * 2
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+    def __len__(self) -> int:
+        return len(self.arrays)
+
+    def percentile_ranks(self, name: str, values: Any) -> np.ndarray:
+        """
+        Percentile rank in [0,1] of each value within the metric's peers. Ties are
+        treated by giving the midpoint fraction for equal values:
+          (count_less + 0.5*count_equal) / n
+        """
+        arr = self.sorted[name]
+        less = np.searchsorted(arr, values, side="left")
+        equal = np.searchsorted(arr, values, side="right") - less
+        return (less + 0.5 * equal) / arr.size
+
+    def winsor_bounds(self, name: str, winsor_pct: float) -> Tuple[float, float]:
+        arr = self.arrays[name]
+        return np.nanpercentile(arr, 100.0 * winsor_pct), np.nanpercentile(arr, 100.0 * (1.0 - winsor_pct))
+
+    def mean_std(self, name: str) -> Tuple[float, float]:
+        arr = self.arrays[name]
+        return float(np.nanmean(arr)), float(np.nanstd(arr, ddof=0))
+
+    def min_max(self, name: str) -> Tuple[float, float]:
+        arr = self.arrays[name]
+        return float(np.nanmin(arr)), float(np.nanmax(arr))
+
+    def metric_names(self) -> List[str]:
+        return list(self.arrays)
+
+
+class SketchDistribution:
     """
-    Percentile rank of `value` within `arr` in [0,1].
-    Ties are treated by giving the midpoint fraction for equal values:
-      (count_less + 0.5*count_equal) / n
+    Peer values per metric kept as mergeable KLL quantile sketches (see
+    src/services/quantile_sketch.py) instead of full arrays: memory per metric is
+    bounded by the sketch size `k` whatever the number of peers, percentile ranks and
+    winsor bounds are binary searches over the sketch, and new peers can be added with
+    update() or merge() without the values seen before. Peer sets of at most `k`
+    values per metric score exactly like a PeerDistribution.
     """
-    arr = np.asarray(arr)
-    if arr.size == 0:
-        return float("nan")
-    # ignore NaNs in arr
-    arr = arr[~np.isnan(arr)]
-    if arr.size == 0:
-        return float("nan")
-    less = np.sum(arr < value)
-    equal = np.sum(arr == value)
-    return float((less + 0.5 * equal) / arr.size)
+
+    def __init__(self, sketches: Dict[str, KLLSketch], direction_map: Optional[Dict[str, bool]] = None, k: int = DEFAULT_K):
+        self.sketches = sketches
+        self.direction_map = direction_map
+        self.k = k
+
+    @classmethod
+    def from_values(
+        cls, values: np.ndarray, names: List[str], direction_map: Optional[Dict[str, bool]] = None, k: int = DEFAULT_K
+    ) -> "SketchDistribution":
+        """From a peers x metrics array; NaNs are dropped per metric."""
+        dist = cls({}, direction_map, k)
+        dist.update(values, names)
+        return dist
+
+    @classmethod
+    def from_frame(cls, peers_df: pd.DataFrame, direction_map: Optional[Dict[str, bool]] = None, k: int = DEFAULT_K) -> "SketchDistribution":
+        """From a DataFrame indexed by metric names with one column per peer entity."""
+        peers = peers_df.T.apply(pd.to_numeric, errors="coerce")
+        return cls.from_values(peers.to_numpy(dtype=float), [str(m) for m in peers.columns], direction_map, k)
+
+    def update(self, values: np.ndarray, names: List[str]) -> "SketchDistribution":
+        """Add peers (a peers x metrics array, e.g. newly filed companies) in place."""
+        profiles = metric_profiles(direction_map=self.direction_map)
+        transformed = profiles.transform(np.asarray(values, dtype=float), profiles.positions(names))
+        for j, name in enumerate(names):
+            col = transformed[:, j]
+            col = col[~np.isnan(col)]
+            if col.size > 0:
+                self.sketches.setdefault(name, KLLSketch(self.k)).update(col)
+        return self
+
+    def merge(self, other: "SketchDistribution") -> "SketchDistribution":
+        """A new distribution holding the peers of both."""
+        out = self.copy()
+        for name, sketch in other.sketches.items():
+            out.sketches.setdefault(name, KLLSketch(self.k)).merge(sketch)
+        return out
+
+    def copy(self) -> "SketchDistribution":
+        return SketchDistribution({name: sketch.copy() for name, sketch in self.sketches.items()}, self.direction_map, self.k)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(sketch.nbytes for sketch in self.sketches.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sketches
+
+    def __len__(self) -> int:
+        return len(self.sketches)
+
+    def percentile_ranks(self, name: str, values: Any) -> np.ndarray:
+        """Percentile rank in [0,1] of each value within the metric's peers (ties at the midpoint)."""
+        return self.sketches[name].ranks(values)
+
+    def winsor_bounds(self, name: str, winsor_pct: float) -> Tuple[float, float]:
+        sketch = self.sketches[name]
+        return sketch.percentile(100.0 * winsor_pct), sketch.percentile(100.0 * (1.0 - winsor_pct))
+
+    def mean_std(self, name: str) -> Tuple[float, float]:
+        sketch = self.sketches[name]
+        return sketch.mean, sketch.std
+
+    def min_max(self, name: str) -> Tuple[float, float]:
+        sketch = self.sketches[name]
+        return sketch.min, sketch.max
+
+    def metric_names(self) -> List[str]:
+        return list(self.sketches)
+
+
+# peer universes the scorers accept as prebuilt (anything else is read as a DataFrame)
+PEER_DISTRIBUTIONS = (PeerDistribution, SketchDistribution)
+
 
 def convert_to_risk_score(category_score: dict) -> dict:
     risk_score_dict = {}
@@ -34,7 +264,7 @@ def convert_to_risk_score(category_score: dict) -> dict:
 def calculate_category_scores(
     metrics: pd.Series,
     ratio_groups: Dict[str, List[str]],
-    peers_df: Optional[pd.DataFrame] = None,
+    peers_df: Optional[Union[pd.DataFrame, PeerDistribution, SketchDistribution]] = None,
     direction_map: Optional[Dict[str, bool]] = None,
     winsor_pct: float = 0.01,
     normalize_method: str = "percentile",  # 'percentile' (preferred) or 'minmax' or 'zscore'
@@ -49,7 +279,9 @@ def calculate_category_scores(
       - ratio_groups: dict category -> list of metric names
 
     Optional:
-      - peers_df: DataFrame indexed by metric names, columns = peer entities (companies / periods).
+      - peers_df: DataFrame indexed by metric names, columns = peer entities (companies / periods),
+                  or a prebuilt PeerDistribution / SketchDistribution (transformed with its own
+                  direction_map).
                   If provided, normalization & winsorization operate across peers (preferred).
       - direction_map: optional dict metric -> bool (True if higher-is-good). If not provided,
                        heuristics will be used.
@@ -71,39 +303,21 @@ def calculate_category_scores(
     metrics.index = metrics.index.astype(str)
     metrics = pd.to_numeric(metrics, errors="coerce")
 
-    # direction heuristics (expandable)
-    def heuristic_higher_is_good(name: str) -> bool:
-        ln = name.lower()
-        # valuation metrics (price-to, p/e, ev-to) usually higher -> more expensive (worse)
-        if any(k in ln for k in ("price-to", "p/e", "p/b", "ev-to", "price to")):
-            return False
-        # typically good if contains these
-        if any(k in ln for k in ("margin", "return", "roe", "roa", "profit", "income", "yield", "growth", "efficiency")):
-            return True
-        # typically bad if contains these
-        if any(k in ln for k in ("debt", "leverage", "capex", "expense", "cost", "volatility", "tracking", "ulcer", "loss", "short")):
-            return False
-        # if name suggests 'per share' treat as positive generally
-        if "per share" in ln or "per-share" in ln:
-            return True
-        # fallback: assume higher is better (we will also normalize sign later)
-        return True
-
-    # keywords to treat as absolute-dollar magnitudes
-    ABS_KEYWORDS = ("tangible", "working capital", "cash", "total assets", "book value", "market cap", "enterprise value", "value")
+    # compiled direction / transform profile of each metric (no keyword scans per call)
+    profiles = metric_profiles(ratio_groups, direction_map)
+    positions = profiles.positions(metrics.index)
 
     # --------------- transform metrics -----------------
     transformed = {}
     transform_notes = {}
-    for name, raw in metrics.items():
+    for (name, raw), j in zip(metrics.items(), positions):
         if pd.isna(raw):
             transform_notes[name] = {"raw": raw, "reason": "nan"}
             continue
         val = float(raw)
-        ln = name.lower()
 
         # detect dollar-like absolute metrics: keyword OR large magnitude
-        is_abs = (abs(val) >= 1e6) or any(k in ln for k in ABS_KEYWORDS)
+        is_abs = (abs(val) >= 1e6) or bool(profiles.abs_magnitude[j])
         if is_abs:
             # compress magnitude while preserving sign: use log10(1+abs)
             t = np.sign(val) * np.log10(abs(val) + 1.0)
@@ -112,11 +326,8 @@ def calculate_category_scores(
             t = float(val)
             transform_notes[name] = {"raw": val, "is_abs": False, "transform": "linear"}
 
-        # directionality: use map override if provided else heuristic
-        if direction_map and name in direction_map:
-            higher_good = bool(direction_map[name])
-        else:
-            higher_good = heuristic_higher_is_good(name)
+        # directionality: map override if provided else heuristic (see MetricProfiles)
+        higher_good = bool(profiles.higher_is_good[j])
 
         transform_notes[name]["higher_is_good"] = higher_good
         # keep "positive = good" convention by flipping when higher_is_good is False
@@ -130,39 +341,16 @@ def calculate_category_scores(
         return {"category_scores": {c: np.nan for c in ratio_groups.keys()}, "per_metric": per_metric_df, "metadata": {"used_peers": peers_df is not None}}
 
     # -------------- prepare peer arrays (if provided) --------------
-    # peers_df expected indexed by metric names. We'll coerce numeric.
+    # peers_df expected indexed by metric names (or an already built peer distribution).
     peers_available = False
-    peers_numeric = {}
+    peers_numeric = set()
+    peers_dist = None
     if peers_df is not None:
         try:
-            # ensure index are strings
-            peers = peers_df.copy()
-            peers.index = peers.index.astype(str)
-            # extract arrays for metrics we care about
-            for m in transformed.keys():
-                if m in peers.index:
-                    arr = pd.to_numeric(peers.loc[m].values, errors="coerce")
-                    # transform arr same way we transformed the single vector entry:
-                    arr_clean = []
-                    for v in arr:
-                        if pd.isna(v):
-                            continue
-                        vv = float(v)
-                        is_abs = (abs(vv) >= 1e6) or any(k in m.lower() for k in ABS_KEYWORDS)
-                        if is_abs:
-                            tv = np.sign(vv) * np.log10(abs(vv) + 1.0)
-                        else:
-                            tv = float(vv)
-                        # incorporate directionality: flip if higher_is_good is False
-                        if direction_map and m in direction_map:
-                            higher_good = bool(direction_map[m])
-                        else:
-                            higher_good = heuristic_higher_is_good(m)
-                        tv = float(tv if higher_good else -tv)
-                        arr_clean.append(tv)
-                    if len(arr_clean) > 0:
-                        peers_numeric[m] = np.array(arr_clean, dtype=float)
-                        peers_available = True
+            peers_dist = peers_df if isinstance(peers_df, PEER_DISTRIBUTIONS) else PeerDistribution.from_frame(peers_df, direction_map)
+            # metrics we care about that have transformed peer values
+            peers_numeric = {m for m in transformed.keys() if m in peers_dist}
+            peers_available = len(peers_numeric) > 0
         except Exception:
             logger.exception("peers_df parsing failed; falling back to no-peers mode.")
             peers_available = False
@@ -170,13 +358,10 @@ def calculate_category_scores(
     # -------------- winsorize & normalize per metric --------------
     per_metric = []
     for name, adj in transformed.items():
-        arr_for_metric = None
-        # if peers available for this metric use that array for winsorize & percentile
+        # if peers available for this metric use their distribution for winsorize & percentile
         if peers_available and name in peers_numeric:
-            arr_for_metric = peers_numeric[name]
             # compute winsor bounds from peers
-            low = np.nanpercentile(arr_for_metric, 100.0 * winsor_pct)
-            high = np.nanpercentile(arr_for_metric, 100.0 * (1.0 - winsor_pct))
+            low, high = peers_dist.winsor_bounds(name, winsor_pct)
             val_w = np.clip(adj, low, high)
         else:
             # fallback: use single-value -> no winsorization possible; just use adj
@@ -185,23 +370,21 @@ def calculate_category_scores(
         # Normalization
         if normalize_method == "percentile":
             if peers_available and name in peers_numeric:
-                # percentile rank of val_w within peers array
-                norm = _percentile_rank(val_w, peers_numeric[name])
+                # percentile rank of val_w within the sorted peers array
+                norm = float(peers_dist.percentile_ranks(name, val_w))
             else:
                 # fallback: min-max across all transformed values for the category will be done later.
                 # For now store raw adjusted value; we will min-max per category below.
                 norm = val_w  # sentinel
         elif normalize_method == "zscore":
             if peers_available and name in peers_numeric:
-                mu = float(np.nanmean(peers_numeric[name]))
-                sd = float(np.nanstd(peers_numeric[name], ddof=0))
+                mu, sd = peers_dist.mean_std(name)
                 norm = 0.0 if sd == 0 else (val_w - mu) / sd
             else:
                 norm = val_w
         elif normalize_method == "minmax":
             if peers_available and name in peers_numeric:
-                mn = float(np.nanmin(peers_numeric[name]))
-                mx = float(np.nanmax(peers_numeric[name]))
+                mn, mx = peers_dist.min_max(name)
                 if np.isclose(mx, mn):
                     norm = 0.5
                 else:
@@ -289,4 +472,180 @@ def calculate_category_scores(
 
     risk_score_dict = convert_to_risk_score(category_scores)
 
-    return {"category_scores": risk_score_dict, "metadata": metadata}
\ No newline at end of file
+    return {"category_scores": risk_score_dict, "metadata": metadata}
+
+# ==================== batch scoring ====================
+def ratios_panel(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reshape a ratios frame ((company, metric) rows x period columns) into the scoring
+    panel calculate_category_scores_batch expects: (company, period) rows x metric columns.
+    """
+    panel = df.stack(future_stack=True).unstack(level=1)
+    panel.index = panel.index.set_names(["company", "period"])
+    panel.columns.name = None
+    return panel
+
+def _row_sums(vals: np.ndarray, ok: np.ndarray) -> np.ndarray:
+    """
+    Row sums of the `ok` entries, added in column order like np.sum over the compacted
+    1-D vector calculate_category_scores averages (valid values moved left, zero padded).
+    """
+    order = np.argsort(~ok, axis=1, kind="stable")
+    packed = np.take_along_axis(np.where(ok, vals, 0.0), order, axis=1)
+    return np.ascontiguousarray(packed).sum(axis=1)
+
+def _peer_groups(
+    peers_df: Any,
+    peer_groups: Optional[Sequence[Hashable]],
+    n_rows: int,
+    direction_map: Optional[Dict[str, bool]],
+) -> List[Tuple[Union[PeerDistribution, SketchDistribution], np.ndarray]]:
+    """(distribution, row positions) pairs: one shared group, or one per distinct key of `peer_groups`."""
+    def as_dist(peers: Any) -> Union[PeerDistribution, SketchDistribution]:
+        return peers if isinstance(peers, PEER_DISTRIBUTIONS) else PeerDistribution.from_frame(peers, direction_map)
+
+    if peer_groups is None:
+        return [(as_dist(peers_df), np.arange(n_rows))]
+    codes, keys = pd.factorize(pd.Index(peer_groups))
+    groups = []
+    for k, key in enumerate(keys):
+        # rows without a peer universe fall back to no-peers scoring
+        if peers_df.get(key) is not None:
+            groups.append((as_dist(peers_df[key]), np.flatnonzero(codes == k)))
+    return groups
+
+def calculate_category_scores_batch(
+    panel: pd.DataFrame,
+    ratio_groups: Dict[str, List[str]],
+    peers_df: Optional[Any] = None,
+    direction_map: Optional[Dict[str, bool]] = None,
+    winsor_pct: float = 0.01,
+    normalize_method: str = "percentile",
+    min_metrics_per_category: int = 1,
+    output_scale: int = 100,
+    peer_groups: Optional[Sequence[Hashable]] = None,
+    return_contributions: bool = False,
+) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Risk scores for many company-period vectors in one call; row i equals
+    calculate_category_scores(panel.iloc[i], ...)["category_scores"] for the same options.
+
+      - panel: rows = company-period vectors (e.g. (company, period) MultiIndex, see
+               ratios_panel), columns = unique metric names
+      - peers_df: peer universe shared by every row (DataFrame indexed by metric names,
+                  columns = peer entities, a PeerDistribution or a SketchDistribution); with
+                  `peer_groups`, a
+                  mapping group key -> universe
+      - peer_groups: one group key per row (e.g. its period, for cross-sectional peers);
+                     rows whose key has no universe are scored without peers
+
+    Transforms, winsorization, normalization and category aggregation are numpy array
+    operations over the whole panel; Python only loops over metrics, categories and
+    peer groups.
+
+    Returns a DataFrame indexed like `panel` with one column per category. With
+    return_contributions=True, also the per-metric contributions averaged into the
+    category scores (normalized 0..1, NaN where a metric was not scored), shaped like
+    `panel`.
+    """
+    if normalize_method not in ("percentile", "zscore", "minmax"):
+        raise ValueError("normalize_method must be 'percentile'|'zscore'|'minmax'")
+
+    names = [str(c) for c in panel.columns]
+    col_pos = {name: j for j, name in enumerate(names)}
+    raw = panel.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    n_rows, n_metrics = raw.shape
+
+    profiles = metric_profiles(ratio_groups, direction_map)
+    positions = profiles.positions(names)
+    # panel column of every profiled metric (-1: not in the panel); a repeated name keeps its last column
+    col_of = np.full(len(profiles), -1)
+    col_of[positions] = np.arange(n_metrics)
+
+    # -------------- transform metrics ----------------
+    valid = ~np.isnan(raw)
+    adj = np.where(valid, profiles.transform(raw, positions), np.nan)
+
+    # -------------- prepare peer distributions (if provided) --------------
+    groups: List[Tuple[Union[PeerDistribution, SketchDistribution], np.ndarray]] = []
+    if peers_df is not None:
+        try:
+            groups = _peer_groups(peers_df, peer_groups, n_rows, direction_map)
+        except Exception:
+            logger.exception("peers_df parsing failed; falling back to no-peers mode.")
+            groups = []
+
+    # -------------- winsorize & normalize per metric --------------
+    # metrics without peers keep their adjusted value (sentinel, see the category fallback)
+    normalized = adj.copy()
+    has_peers = np.zeros((n_rows, n_metrics), dtype=bool)
+    for dist, rows in groups:
+        for name in dist.metric_names():
+            j = col_pos.get(name)
+            if j is None:
+                continue
+            has_peers[rows, j] = True
+            low, high = dist.winsor_bounds(name, winsor_pct)
+            val_w = np.clip(adj[rows, j], low, high)
+            if normalize_method == "percentile":
+                norm = dist.percentile_ranks(name, val_w)
+            elif normalize_method == "zscore":
+                mu, sd = dist.mean_std(name)
+                norm = np.zeros(rows.size) if sd == 0 else (val_w - mu) / sd
+            else:
+                mn, mx = dist.min_max(name)
+                norm = np.full(rows.size, 0.5) if np.isclose(mx, mn) else (val_w - mn) / (mx - mn)
+            normalized[rows, j] = np.where(valid[rows, j], norm, np.nan)
+
+    # per row: did any of its valid metrics have peers (the scalar path's `peers_available`)
+    peers_available = (valid & has_peers).any(axis=1)
+
+    # -------------- category min-max fallback (percentile without peers) --------------
+    fallback = ~peers_available if normalize_method == "percentile" else np.zeros(n_rows, dtype=bool)
+    if fallback.any():
+        scaled_all = np.full_like(adj, np.nan)
+        # categories are scaled in order; a metric in several categories keeps the
+        # scaling of the last category that had values for that row
+        for category_pos in profiles.category_positions:
+            cols = col_of[category_pos]
+            cols = cols[cols >= 0]
+            if cols.size == 0:
+                continue
+            block = adj[:, cols]
+            with np.errstate(invalid="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                mn = np.nanmin(block, axis=1, keepdims=True)
+                mx = np.nanmax(block, axis=1, keepdims=True)
+                scaled = np.where(np.isclose(mx, mn), 0.5, np.clip((block - mn) / (mx - mn), 0.0, 1.0))
+            write = valid[:, cols] & fallback[:, None]
+            scaled_all[:, cols] = np.where(write, scaled, scaled_all[:, cols])
+        normalized[fallback] = scaled_all[fallback]
+
+    # -------------- aggregate per category ----------------
+    if normalize_method == "zscore":
+        from scipy.stats import norm as _norm
+        contrib = _norm.cdf(normalized)
+    else:
+        contrib = np.clip(normalized, 0.0, 1.0)
+
+    scores = np.full((n_rows, len(ratio_groups)), np.nan)
+    for k, category_pos in enumerate(profiles.category_positions):
+        cols = col_of[category_pos]
+        cols = cols[cols >= 0]
+        if cols.size == 0:
+            continue
+        ok = ~np.isnan(normalized[:, cols])
+        count = ok.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = _row_sums(contrib[:, cols], ok) / count
+        scores[:, k] = np.where(count < min_metrics_per_category, np.nan, mean * output_scale)
+
+    # Python's round() (not np.round) so every score matches the scalar path exactly
+    rounded = np.array([round(float(v), 2) for v in scores.ravel()]).reshape(scores.shape)
+    result = pd.DataFrame(100 - rounded, index=panel.index, columns=list(ratio_groups))
+
+    logger.info("Calculated category scores for %d vectors x %d categories (peer groups: %d)", n_rows, len(ratio_groups), len(groups))
+    if return_contributions:
+        contrib = np.where(np.isnan(normalized), np.nan, contrib)
+        return result, pd.DataFrame(contrib, index=panel.index, columns=panel.columns)
+    return result
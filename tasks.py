@@ -1,12 +1,19 @@
+import hashlib
+import json
 import os
-import pandas as pd
-import numpy as np
-from celery import Celery
+from typing import Any, Optional, Sequence
+from celery import Celery, states
+from celery.result import AsyncResult
+from celery.signals import task_postrun, task_prerun
 from dotenv import load_dotenv
+from kombu.utils.json import register_type
+import numpy as np
 
 # Import your existing core logic
-from src.core.constants import RATIO_GROUPS
-from src.services.risk_matrix import calculate_category_scores
+from src.services.dataset_cache import DatasetCache
+from src.services.quant_materialized import MaterializedViews
+from src.services.quant_reader import QuantDataReader
+from src.services.quant_views import DEFAULT_TRAILING_PERIODS, charts_view, ratios_view, performance_view, risk_matrix_view, dashboard_view, ratio_comparison_view, market_analytics_view, risk_history_view, risk_drivers_view
 from src.orchestration.graph import run_pipeline
 
 load_dotenv()
@@ -18,88 +25,149 @@ celery_app = Celery(
     backend="redis://localhost:6379/0"
 )
 
-AZURE_BASE = "az://data"
+# Task routing: quant tasks are short CPU-bound reads for a prefork worker on the quant
+# queue; the qualitative LLM pipeline mostly waits on network calls for up to minutes, so
+# it runs on its own queue in a threads worker and never holds up a chart request
+# (see the worker and worker-llm services in docker-compose.yml)
+QUANT_QUEUE = os.getenv("CELERY_QUANT_QUEUE", "quant")
+LLM_QUEUE = os.getenv("CELERY_LLM_QUEUE", "llm")
+celery_app.conf.update(
+    task_default_queue=QUANT_QUEUE,
+    task_routes={"fetch_qualitative_task": {"queue": LLM_QUEUE}},
+    # a running task reports STARTED, so enqueue_coalesced can tell it from an unknown one
+    task_track_started=True,
+)
+
+# columnar payloads hold numpy arrays (see quant_serialization.to_columnar); task results
+# keep them as arrays, NaN included, so the API writes them straight out with orjson
+register_type(
+    np.ndarray,
+    "ndarray",
+    lambda a: {"dtype": a.dtype.str, "values": a.tolist()},
+    lambda o: np.asarray(o["values"], dtype=o["dtype"]),
+)
 
-def _read_parquet(path: str) -> pd.DataFrame:
+STORAGE_OPTIONS = {"connection_string": os.getenv("AZURE_STORAGE_CONNECTION_STRING")}
+
+# Request coalescing (enqueue_coalesced): identical requests share one task. A queued task
+# is reused for up to TASK_COALESCE_PENDING_SECONDS and a running one for that long after
+# it started, a succeeded one for TASK_COALESCE_SECONDS; a failed one is enqueued again
+# by the next request
+TASK_COALESCE_SECONDS = int(os.getenv("TASK_COALESCE_SECONDS", 60))
+TASK_COALESCE_PENDING_SECONDS = int(os.getenv("TASK_COALESCE_PENDING_SECONDS", 600))
+COALESCE_PREFIX = "task-coalesce:"
+
+# One cache per process (each worker, and the API for its inline fast path);
+# frames it returns are shared and must not be mutated
+dataset_cache = DatasetCache(storage_options=STORAGE_OPTIONS)
+quant_reader = QuantDataReader(dataset_cache, storage_options=STORAGE_OPTIONS)
+# payloads precomputed by src/scripts/materialize_quant_views.py; a miss falls back to the view
+materialized_views = MaterializedViews(quant_reader)
+
+# ---------------- request coalescing ----------------
+def coalesced_task_id(task_name: str, key: Any) -> str:
+    """Deterministic task id of `task_name` for a JSON-serializable request key."""
+    canonical = json.dumps(key, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{task_name}-{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}"
+
+def enqueue_coalesced(task, args: Sequence[Any], key: Any = None) -> str:
+    """
+    Enqueue `task(*args)` under the task id derived from `key` (default: the arguments)
+    and return that id. When the same id is already queued, running or recently
+    succeeded, nothing is enqueued and the caller shares that task's result.
+    """
+    task_id = coalesced_task_id(task.name, list(args) if key is None else key)
+    client = celery_app.backend.client
+    marker = COALESCE_PREFIX + task_id
+    if not client.set(marker, 1, nx=True, ex=TASK_COALESCE_PENDING_SECONDS):
+        return task_id
     try:
-        df = pd.read_parquet(
-            path,
-            storage_options={
-                "connection_string": os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-            }
-        )
-        return df
-    except Exception as e:
-        print(f"AZURE ERROR: {e}")
+        result = AsyncResult(task_id, app=celery_app)
+        if result.state in (states.RECEIVED, states.STARTED, states.RETRY):
+            # still running although its marker expired: keep sharing it
+            return task_id
+        if result.state in states.READY_STATES:
+            # a finished earlier run under this id must not be mistaken for the new one
+            result.forget()
+        task.apply_async(args=list(args), task_id=task_id)
+    except Exception:
+        client.delete(marker)
         raise
+    return task_id
 
-@celery_app.task(name="fetch_charts_task")
-def fetch_charts_task(company: str, variables: list, timeframe: str):
-    blob_path = f"{AZURE_BASE}/stocks/{timeframe}/{timeframe}.parquet"
-    df = _read_parquet(blob_path)
-
-    if isinstance(df.index, pd.PeriodIndex):
-        df.index = df.index.to_timestamp()
+def qualitative_key(company: str, period: str, query: str) -> list:
+    """Coalescing key of a qualitative request: case and whitespace do not matter."""
+    return [company.strip().upper(), period.strip().upper(), " ".join(query.split()).casefold()]
 
-    selected = [(var, company) for var in variables if (var, company) in df.columns]
-    if not selected:
-        return []
+@task_prerun.connect
+def _start_coalesced(task_id: Optional[str] = None, **kwargs):
+    # the pending window restarts when the task starts, so a task that waited in the
+    # queue is not enqueued again while it runs
+    try:
+        celery_app.backend.client.set(COALESCE_PREFIX + task_id, 1, ex=TASK_COALESCE_PENDING_SECONDS)
+    except Exception as e:
+        print("COALESCE MARKER ERROR:", repr(e))
 
-    out = df[selected].copy()
-    out.columns = [col[0] for col in selected]
-    out["date"] = df.index.astype(str) # Convert to string for JSON serialization
-    out = out.replace([np.inf, -np.inf, np.nan], None).sort_index()
+@task_postrun.connect
+def _settle_coalesced(task_id: Optional[str] = None, state: Optional[str] = None, **kwargs):
+    # successes stay shareable for TASK_COALESCE_SECONDS, anything else is released
+    try:
+        marker = COALESCE_PREFIX + task_id
+        if state == "SUCCESS":
+            celery_app.backend.client.expire(marker, TASK_COALESCE_SECONDS)
+        else:
+            celery_app.backend.client.delete(marker)
+    except Exception as e:
+        print("COALESCE MARKER ERROR:", repr(e))
 
-    return out.reset_index(drop=True).to_dict(orient="records")
+@celery_app.task(name="fetch_charts_task")
+def fetch_charts_task(company: str, variables: list, timeframe: str, max_points: Optional[int] = None, response_format: str = "records"):
+    return charts_view(quant_reader, company, variables, timeframe, max_points, response_format)
 
 @celery_app.task(name="fetch_ratios_task")
-def fetch_ratios_task(company: str, timeframe: str, variables: list):
-    blob_path = f"{AZURE_BASE}/ratios/{timeframe}/all_ratios.parquet"
-    df = _read_parquet(blob_path)
+def fetch_ratios_task(company: str, timeframe: str, variables: list, response_format: str = "records"):
+    if response_format == "records":
+        payload = materialized_views.ratios(company, timeframe, variables)
+        if payload is not None:
+            return payload
+    return ratios_view(quant_reader, company, timeframe, variables, response_format)
 
-    if not isinstance(df.index, pd.MultiIndex):
-        raise ValueError("Expected MultiIndex index in ratios parquet")
+@celery_app.task(name="fetch_ratio_comparison_task")
+def fetch_ratio_comparison_task(companies: list, variables: list, periods: list, timeframe: str, response_format: str = "records"):
+    return ratio_comparison_view(quant_reader, companies, variables, periods, timeframe, response_format)
 
-    df_company = df.xs(company, level=0)
-    if variables:
-        df_company = df_company.reindex(variables)
+@celery_app.task(name="fetch_market_analytics_task")
+def fetch_market_analytics_task(companies: list, metrics: list, timeframe: str, window: Optional[int] = None, response_format: str = "records"):
+    return market_analytics_view(quant_reader, companies, metrics, timeframe, window, response_format)
 
-    df_company.columns = df_company.columns.to_period().astype(str)
-    df_company = df_company.replace([np.inf, -np.inf, np.nan], None)
-
-    return df_company.reset_index().to_dict(orient='records')
+@celery_app.task(name="fetch_risk_history_task")
+def fetch_risk_history_task(companies: list, timeframe: str, peers: str = "period", response_format: str = "records"):
+    return risk_history_view(quant_reader, companies, timeframe, peers, response_format)
 
 @celery_app.task(name="fetch_performance_task")
-def fetch_performance_task(company: str, period: str, timeframe: str):
-    blob_path = f"{AZURE_BASE}/metrics/{timeframe}/all_metrics.parquet"
-    df = _read_parquet(blob_path)
-
-    if not isinstance(df.columns, pd.MultiIndex):
-        return {}
-    
-    df_company = df.xs(company, level=1, axis=1)
-    period_fmt = period[3:] + period[:2]
-    df_company_period = df_company[df_company.index == period_fmt]
-    df_company_period.index = df_company_period.index.astype(str)
-    df_company_period = df_company_period.replace([np.inf, -np.inf, np.nan], None)
-
-    return df_company_period.reset_index().to_dict(orient='records')
+def fetch_performance_task(company: str, period: str, timeframe: str, response_format: str = "records"):
+    if response_format == "records":
+        payload = materialized_views.performance(company, period, timeframe)
+        if payload is not None:
+            return payload
+    return performance_view(quant_reader, company, period, timeframe, response_format)
 
 @celery_app.task(name="fetch_risk_matrix_task")
-def fetch_risk_matrix_task(company: str, period: str, timeframe: str, top_n: str):
-    blob_path = f"{AZURE_BASE}/ratios/{timeframe}/all_ratios.parquet"
-    df = _read_parquet(blob_path)
-
-    if not isinstance(df.index, pd.MultiIndex):
-        return {}
-    
-    df.columns = df.columns.to_period().astype(str)
-    period_fmt = period[3:] + period[:2]
-    df_company = df.xs(company, level=0, axis=0)
-    df_company_period = df_company.loc[:, period_fmt]
-
-    result = calculate_category_scores(df_company_period, RATIO_GROUPS)
-    return result["category_scores"]
+def fetch_risk_matrix_task(company: str, period: str, timeframe: str, peers: str = "period", trailing: int = DEFAULT_TRAILING_PERIODS):
+    if peers == "period":
+        # materialized risk scores use the same-period peer universe
+        payload = materialized_views.risk_matrix(company, period, timeframe)
+        if payload is not None:
+            return payload
+    return risk_matrix_view(quant_reader, company, period, timeframe, peers, trailing)
+
+@celery_app.task(name="fetch_risk_drivers_task")
+def fetch_risk_drivers_task(company: str, period: str, timeframe: str, top_n: int = 5, method: str = "percentile"):
+    return risk_drivers_view(quant_reader, company, period, timeframe, top_n, method)
+
+@celery_app.task(name="fetch_dashboard_task")
+def fetch_dashboard_task(company: str, period: str, timeframe: str, chart_variables: list, ratio_variables: list, chart_timeframe: str, max_points: Optional[int] = None, response_format: str = "records"):
+    return dashboard_view(quant_reader, company, period, timeframe, chart_variables, ratio_variables, chart_timeframe, max_points, response_format)
 
 @celery_app.task(name="fetch_qualitative_task")
 def fetch_qualitative_task(company: str, period: str, query: str):